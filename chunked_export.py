@@ -0,0 +1,156 @@
+import multiprocessing
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+
+from encoders import create_encoder
+
+# Shorter chunks are not worth the process start-up and concatenation overhead
+MIN_CHUNK_FRAMES = 60
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def video_info(path):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise Exception(f"Could not open recording {path}")
+    try:
+        frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS) or 60.0
+        size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    finally:
+        cap.release()
+    return frames, fps, size
+
+
+def split_chunks(total_frames, workers):
+    count = max(1, min(workers, total_frames // MIN_CHUNK_FRAMES))
+    bounds = [round(i * total_frames / count) for i in range(count + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _encode_chunk(source, segment_path, start, end, fps, size, backend, options, progress, cancel):
+    # Runs in a worker process: decode frames [start, end) of the source and encode them
+    cap = cv2.VideoCapture(source)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    try:
+        out = create_encoder(segment_path, fps, size, "bgr", backend, **options)
+    except Exception:
+        cap.release()
+        raise
+
+    written = 0
+    try:
+        for _ in range(start, end):
+            if cancel.is_set():
+                break
+            ok, frame = cap.read()
+            if not ok:
+                break
+            out.write(frame)
+            written += 1
+            if written % 10 == 0:
+                progress.put(10)
+        progress.put(written % 10)
+    finally:
+        out.close()
+        cap.release()
+    return written
+
+
+def concat_segments(segments, path):
+    # Stream copy through ffmpeg's concat demuxer, so joining does not re-encode anything
+    fd, list_path = tempfile.mkstemp(suffix=".txt")
+    try:
+        with os.fdopen(fd, "w") as f:
+            for segment in segments:
+                f.write(f"file '{os.path.abspath(segment)}'\n")
+        subprocess.run(
+            ["ffmpeg", "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy", path],
+            check=True, capture_output=True
+        )
+    except subprocess.CalledProcessError as e:
+        raise Exception(f"ffmpeg failed to join segments: {e.stderr.decode(errors='replace').strip()}")
+    finally:
+        os.remove(list_path)
+
+
+class ChunkedExporter:
+    # Re-encodes a finished recording in parallel: the frame range is split into one chunk
+    # per core, chunks are encoded in a process pool and then joined losslessly.
+    # The recording should use an intra-only codec (MJPG) so every chunk can seek exactly.
+    def __init__(self, source, path, workers=None, backend="opencv", options=None):
+        self.source = source
+        self.path = path
+        self.workers = workers or os.cpu_count() or 1
+        self.backend = backend
+        self.options = options or {}
+        self.cancelled = False
+        self._cancel_event = None
+
+    def cancel(self):
+        self.cancelled = True
+        if self._cancel_event is not None:
+            self._cancel_event.set()
+
+    def run(self, progress=None):
+        total, fps, size = video_info(self.source)
+        workers = self.workers
+        if workers > 1 and shutil.which("ffmpeg") is None:
+            print("ffmpeg not found, exporting in a single chunk")
+            workers = 1
+        chunks = split_chunks(total, workers)
+
+        segment_dir = tempfile.mkdtemp(prefix="export_")
+        ext = os.path.splitext(self.path)[1] or ".mp4"
+        segments = [os.path.join(segment_dir, f"segment_{i:04d}{ext}") for i in range(len(chunks))]
+        print(f"Exporting {total} frames in {len(chunks)} chunks on {workers} workers")
+
+        start_time = time.perf_counter()
+        try:
+            with multiprocessing.Manager() as manager:
+                progress_queue = manager.Queue()
+                self._cancel_event = manager.Event()
+                if self.cancelled:
+                    self._cancel_event.set()
+
+                with ProcessPoolExecutor(max_workers=len(chunks)) as pool:
+                    futures = [
+                        pool.submit(_encode_chunk, self.source, segment, start, end, fps, size,
+                                    self.backend, self.options, progress_queue, self._cancel_event)
+                        for segment, (start, end) in zip(segments, chunks)
+                    ]
+                    done = 0
+                    while not all(f.done() for f in futures) or not progress_queue.empty():
+                        try:
+                            done += progress_queue.get(timeout=0.1)
+                        except queue.Empty:
+                            continue
+                        if progress:
+                            progress(done, total)
+                    for f in futures:
+                        f.result()
+                self._cancel_event = None
+
+            if self.cancelled:
+                raise ExportCancelled()
+
+            if len(segments) == 1:
+                shutil.move(segments[0], self.path)
+            else:
+                concat_segments(segments, self.path)
+        finally:
+            shutil.rmtree(segment_dir, ignore_errors=True)
+
+        elapsed = time.perf_counter() - start_time
+        print(f"Exported {total} frames in {elapsed:.1f}s ({total / max(elapsed, 1e-6):.1f} fps)")
+        return self.path
@@ -0,0 +1,58 @@
+import math
+
+
+class DynamicResolution:
+    # Adjusts the internal render scale to keep frame time within a budget. Scaling down
+    # happens as soon as the smoothed frame time is over budget; scaling back up only after
+    # it has stayed well under budget for `hold_frames`, so the scale does not oscillate.
+    def __init__(self, target_ms, min_scale=0.5, max_scale=1.0, step=0.05, headroom=0.8, hold_frames=60, cooldown_frames=10):
+        self.target_ms = target_ms
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+        self.step = step
+        self.headroom = headroom
+        self.hold_frames = hold_frames
+        self.cooldown_frames = cooldown_frames
+        self.reset()
+
+    def reset(self):
+        self.scale = self.max_scale
+        self.average_ms = None
+        self.frames_under = 0
+        self.cooldown = 0
+
+    def update(self, frame_ms):
+        # Feed one frame time in milliseconds; returns the scale for the next frame
+        if frame_ms is None:
+            return self.scale
+        if self.average_ms is None:
+            self.average_ms = frame_ms
+        else:
+            self.average_ms += 0.1 * (frame_ms - self.average_ms)
+
+        # Measurements lag a few frames behind, so let a new scale settle before judging it
+        if self.cooldown > 0:
+            self.cooldown -= 1
+            return self.scale
+
+        if self.average_ms > self.target_ms:
+            # Cost follows the pixel count, i.e. the square of the scale
+            wanted = self.scale * math.sqrt(self.target_ms / self.average_ms)
+            self._set_scale(math.floor(wanted / self.step) * self.step)
+        elif self.average_ms < self.target_ms * self.headroom:
+            self.frames_under += 1
+            if self.frames_under >= self.hold_frames:
+                self._set_scale(self.scale + self.step)
+        else:
+            self.frames_under = 0
+        return self.scale
+
+    def _set_scale(self, scale):
+        scale = round(min(self.max_scale, max(self.min_scale, scale)), 4)
+        self.frames_under = 0
+        if scale == self.scale:
+            return
+        # Predict the new frame time so the average does not trigger a second change
+        self.average_ms *= (scale / self.scale) ** 2
+        self.scale = scale
+        self.cooldown = self.cooldown_frames
@@ -0,0 +1,110 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from encoders import create_encoder
+
+# (label, backend, options, file extension)
+CONFIGS = [
+    ("opencv mp4v", "opencv", {"fourcc": "mp4v"}, ".mp4"),
+    ("opencv MJPG", "opencv", {"fourcc": "MJPG"}, ".avi"),
+    ("ffmpeg h264 ultrafast", "ffmpeg", {"codec": "h264", "crf": 18, "preset": "ultrafast"}, ".mp4"),
+    ("ffmpeg h264 medium", "ffmpeg", {"codec": "h264", "crf": 18, "preset": "medium"}, ".mp4"),
+    ("ffmpeg h265 medium", "ffmpeg", {"codec": "h265", "crf": 22, "preset": "medium"}, ".mp4"),
+    ("ffmpeg prores", "ffmpeg", {"codec": "prores"}, ".mov"),
+]
+
+
+def synthetic_frames(count, width, height):
+    # Smoothly moving colour bands with a little noise, roughly like shader output
+    y, x = np.mgrid[0:height, 0:width].astype('f4')
+    rng = np.random.default_rng(0)
+    frames = []
+    for i in range(count):
+        t = i / 30.0
+        r = np.sin(x * 0.013 + t * 2.0) + np.cos(y * 0.011 - t)
+        g = np.sin((x + y) * 0.009 + t * 1.3)
+        b = np.cos(np.hypot(x - width / 2, y - height / 2) * 0.02 - t * 3.0)
+        image = np.stack([b, g, r], axis=-1) * 60.0 + 128.0
+        image += rng.normal(0.0, 2.0, image.shape).astype('f4')
+        frames.append(np.clip(image, 0, 255).astype('u1'))
+    return frames
+
+
+def shader_frames(shader_name, count, width, height):
+    from render_cli import OfflineRenderer
+    offline = OfflineRenderer(shader_name, width, height, 60)
+    frames = []
+    for _ in range(count):
+        offline.render_frame()
+        frames.append(offline.read_frame().copy())
+    return frames
+
+
+def run_benchmark(frames, fps=60):
+    height, width = frames[0].shape[:2]
+    results = []
+    out_dir = tempfile.mkdtemp(prefix="encoder_benchmark_")
+    try:
+        for label, backend, options, ext in CONFIGS:
+            if backend == "ffmpeg" and shutil.which("ffmpeg") is None:
+                print(f"{label:<24} skipped (ffmpeg not found)")
+                continue
+            path = os.path.join(out_dir, label.replace(" ", "_") + ext)
+            try:
+                start = time.perf_counter()
+                out = create_encoder(path, fps, (width, height), "bgr", backend, **options)
+                for frame in frames:
+                    out.write(frame)
+                out.close()
+                elapsed = time.perf_counter() - start
+            except Exception as e:
+                print(f"{label:<24} failed: {e}")
+                continue
+
+            size = os.path.getsize(path)
+            result = {
+                "label": label,
+                "backend": backend,
+                "options": options,
+                "encode_fps": len(frames) / elapsed,
+                "size_bytes": size,
+                "bits_per_pixel": size * 8 / (len(frames) * width * height),
+            }
+            results.append(result)
+            print(f"{label:<24} {result['encode_fps']:8.1f} fps {size / 1e6:9.2f} MB {result['bits_per_pixel']:7.3f} bpp")
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare encoder backends on speed and output size.")
+    parser.add_argument("--frames", type=int, default=120)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--shader", help="Encode frames rendered from this shader instead of a synthetic pattern")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    if args.shader:
+        frames = shader_frames(args.shader, args.frames, args.width, args.height)
+    else:
+        frames = synthetic_frames(args.frames, args.width, args.height)
+
+    print(f"Encoding {len(frames)} frames at {args.width}x{args.height}")
+    results = run_benchmark(frames)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"width": args.width, "height": args.height, "frames": len(frames), "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+import shutil
+import subprocess
+
+import cv2
+import numpy as np
+
+import tracing
+
+# Conversions for frames captured in a YUV layout, for backends that only take BGR
+YUV_TO_BGR = {
+    "i420": cv2.COLOR_YUV2BGR_I420,
+    "nv12": cv2.COLOR_YUV2BGR_NV12,
+}
+
+PIXEL_FORMATS = ("bgr",) + tuple(YUV_TO_BGR)
+
+
+def frame_size(frame, pixel_format):
+    # (width, height) of the image stored in a captured frame
+    if pixel_format == "bgr":
+        return frame.shape[1], frame.shape[0]
+    return frame.shape[1], frame.shape[0] * 2 // 3
+
+
+class OpenCVBackend:
+    name = "opencv"
+
+    def __init__(self, path, fps, size, pixel_format="bgr", fourcc="mp4v", quality=None):
+        self.pixel_format = pixel_format
+        self.out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+        if not self.out.isOpened():
+            raise Exception("Could not open VideoWriter. Check if the path is writable.")
+        if quality is not None:
+            self.out.set(cv2.VIDEOWRITER_PROP_QUALITY, quality)
+
+    def write(self, frame):
+        if self.pixel_format != "bgr":
+            with tracing.span("cvtColor", "convert", pixel_format=self.pixel_format):
+                frame = cv2.cvtColor(frame, YUV_TO_BGR[self.pixel_format])
+        self.out.write(frame)
+
+    def close(self):
+        self.out.release()
+
+
+class FFmpegBackend:
+    # Pipes raw frames into a local ffmpeg process. YUV frames are passed through untouched.
+    name = "ffmpeg"
+
+    # codec -> (ffmpeg encoder, output pixel format, extra arguments)
+    CODECS = {
+        "h264": ("libx264", "yuv420p", []),
+        "h265": ("libx265", "yuv420p", ["-tag:v", "hvc1"]),
+        "prores": ("prores_ks", "yuv422p10le", ["-profile:v", "3"]),
+    }
+    INPUT_FORMATS = {"bgr": "bgr24", "i420": "yuv420p", "nv12": "nv12"}
+
+    def __init__(self, path, fps, size, pixel_format="bgr", codec="h264", crf=18, preset="medium"):
+        if codec not in self.CODECS:
+            raise ValueError(f"Unknown codec '{codec}'")
+        ffmpeg = shutil.which("ffmpeg")
+        if ffmpeg is None:
+            raise Exception("ffmpeg was not found on the PATH.")
+
+        encoder, output_format, extra = self.CODECS[codec]
+        width, height = size
+        cmd = [
+            ffmpeg, "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", self.INPUT_FORMATS[pixel_format],
+            "-s", f"{width}x{height}", "-r", str(fps), "-i", "-",
+            "-c:v", encoder, "-pix_fmt", output_format,
+        ]
+        if codec != "prores":
+            cmd += ["-crf", str(crf), "-preset", preset]
+        cmd += extra + [path]
+
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def write(self, frame):
+        try:
+            self.proc.stdin.write(np.ascontiguousarray(frame).data)
+        except BrokenPipeError:
+            self.close()
+
+    def close(self):
+        if self.proc.stdin and not self.proc.stdin.closed:
+            try:
+                self.proc.stdin.close()
+            except BrokenPipeError:
+                pass
+        stderr = self.proc.stderr.read().decode(errors="replace").strip()
+        if self.proc.wait() != 0:
+            raise Exception(f"ffmpeg exited with code {self.proc.returncode}: {stderr}")
+
+
+BACKENDS = {
+    OpenCVBackend.name: OpenCVBackend,
+    FFmpegBackend.name: FFmpegBackend,
+}
+
+
+def create_encoder(path, fps, size, pixel_format="bgr", backend="opencv", **options):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown encoder backend '{backend}'")
+    if pixel_format not in PIXEL_FORMATS:
+        raise ValueError(f"Unknown pixel format '{pixel_format}'")
+    return BACKENDS[backend](path, fps, size, pixel_format=pixel_format, **options)
+
+
+def encoder_config(settings):
+    # Backend name and its options as chosen in settings.json
+    backend = settings["encoder_backend"]
+    if backend == "ffmpeg":
+        return backend, {
+            "codec": settings["encoder_codec"],
+            "crf": settings["encoder_crf"],
+            "preset": settings["encoder_preset"],
+        }
+    return backend, {"fourcc": settings["encoder_fourcc"]}
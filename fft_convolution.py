@@ -0,0 +1,166 @@
+import moderngl
+import numpy as np
+
+FFT_VERTEX_SHADER = """
+    #version 330
+    in vec2 in_vert;
+    void main() {
+        gl_Position = vec4(in_vert, 0.0, 1.0);
+    }
+"""
+
+# One channel of the state as a complex number (value, 0)
+PACK_SHADER = """
+    #version 330
+    uniform sampler2D state;
+    uniform vec4 channel;
+    out vec4 f_color;
+    void main() {
+        f_color = vec4(dot(texelFetch(state, ivec2(gl_FragCoord.xy), 0), channel), 0.0, 0.0, 0.0);
+    }
+"""
+
+# One radix-2 Stockham pass along rows or columns: combines the even and odd halves of every
+# subtransform of the previous pass. Input and output are both in natural order.
+FFT_SHADER = """
+    #version 330
+    uniform sampler2D tex;
+    uniform int horizontal;
+    uniform int subtransform;
+    uniform float direction;
+    uniform float scale;
+    out vec4 f_color;
+    void main() {
+        ivec2 p = ivec2(gl_FragCoord.xy);
+        ivec2 size = textureSize(tex, 0);
+        int n = horizontal != 0 ? size.x : size.y;
+        int index = horizontal != 0 ? p.x : p.y;
+        int half_size = subtransform / 2;
+        int even = (index / subtransform) * half_size + index % half_size;
+        vec2 a = texelFetch(tex, horizontal != 0 ? ivec2(even, p.y) : ivec2(p.x, even), 0).xy;
+        vec2 b = texelFetch(tex, horizontal != 0 ? ivec2(even + n / 2, p.y) : ivec2(p.x, even + n / 2), 0).xy;
+        float angle = direction * 6.283185307 * float(index % subtransform) / float(subtransform);
+        vec2 w = vec2(cos(angle), sin(angle));
+        f_color = vec4((a + vec2(w.x * b.x - w.y * b.y, w.x * b.y + w.y * b.x)) * scale, 0.0, 0.0);
+    }
+"""
+
+# Multiplies the state spectrum F by both kernel spectra at once as F * inner + i * F * outer.
+# Both convolutions are real, so after the inverse transform the inner mean is the real part
+# and the outer mean the imaginary part.
+MULTIPLY_SHADER = """
+    #version 330
+    uniform sampler2D tex;
+    uniform sampler2D kernels;
+    out vec4 f_color;
+    vec2 mul(vec2 a, vec2 b) {
+        return vec2(a.x * b.x - a.y * b.y, a.x * b.y + a.y * b.x);
+    }
+    void main() {
+        ivec2 p = ivec2(gl_FragCoord.xy);
+        vec2 f = texelFetch(tex, p, 0).xy;
+        vec4 k = texelFetch(kernels, p, 0);
+        vec2 inner = mul(f, k.xy);
+        vec2 outer = mul(f, k.zw);
+        f_color = vec4(inner.x - outer.y, inner.y + outer.x, 0.0, 0.0);
+    }
+"""
+
+
+def disk_kernels(size, ri, ra):
+    # Spectra of the normalized inner disk (radius ri) and annulus (ri to ra) on a wrapping
+    # grid, as a (height, width, 4) float32 array of (inner re, inner im, outer re, outer im).
+    # Edges are antialiased so the radii can change smoothly.
+    width, height = size
+    dx = np.minimum(np.arange(width), width - np.arange(width))
+    dy = np.minimum(np.arange(height), height - np.arange(height))
+    distance = np.hypot(dx[None, :], dy[:, None])
+    inner = np.clip(ri + 0.5 - distance, 0.0, 1.0)
+    outer = np.clip(ra + 0.5 - distance, 0.0, 1.0) - inner
+    spectra = np.empty((height, width, 4), dtype='f4')
+    for offset, kernel in ((0, inner), (2, outer)):
+        spectrum = np.fft.fft2(kernel / max(kernel.sum(), 1e-6))
+        spectra[..., offset] = spectrum.real
+        spectra[..., offset + 1] = spectrum.imag
+    return spectra
+
+
+class DiskConvolution:
+    # Mean of one state channel over a disk of radius ri and over the annulus from ri to ra
+    # around every texel, by FFT: one forward and one inverse 2D transform of log2(width) +
+    # log2(height) passes each, so the cost does not depend on the radii. The state wraps
+    # around and its size must be a power of two.
+    def __init__(self, ctx):
+        self.ctx = ctx
+        self.quad = ctx.buffer(np.array([-1.0, -1.0, 1.0, -1.0, -1.0, 1.0, 1.0, 1.0], dtype='f4'))
+        self.programs = {}
+        self.vaos = {}
+        for name, source in (("pack", PACK_SHADER), ("fft", FFT_SHADER), ("multiply", MULTIPLY_SHADER)):
+            self.programs[name] = ctx.program(vertex_shader=FFT_VERTEX_SHADER, fragment_shader=source)
+            self.vaos[name] = ctx.vertex_array(self.programs[name], [(self.quad, '2f', 'in_vert')])
+        # Ping-pong complex work textures and their framebuffers
+        self.work = []
+        self.work_fbos = []
+        self.kernels = None
+        self.kernel_key = None
+
+    def run(self, state, target, framebuffer, channel=0, ri=3.0, ra=9.0):
+        # Write (inner mean, outer mean) of `state` into the two-channel float texture `target`,
+        # drawing into it through `framebuffer(textures)`
+        width, height = state.size
+        if width & (width - 1) or height & (height - 1):
+            raise ValueError(f"FFT convolution needs a power-of-two grid, not {width}x{height}")
+        self._allocate(state.size, ri, ra)
+
+        self._draw("pack", self.work_fbos[0], state=(state, 0), channel=tuple(float(i == channel) for i in range(4)))
+        current = self._transform(0, -1.0)
+        self._draw("multiply", self.work_fbos[1 - current], tex=(self.work[current], 0), kernels=(self.kernels, 1))
+        self._transform(1 - current, 1.0, framebuffer([target]), 1.0 / (width * height))
+
+    def release(self):
+        for resource in self.work + self.work_fbos + list(self.vaos.values()) + list(self.programs.values()):
+            resource.release()
+        if self.kernels:
+            self.kernels.release()
+        self.quad.release()
+
+    def _transform(self, current, direction, output=None, scale=1.0):
+        # 2D FFT of work[current] (direction -1) or its inverse (+1). The last pass is scaled and
+        # written to `output` if given; returns the index of the work texture holding the result.
+        width, height = self.work[0].size
+        passes = [(1, 1 << s) for s in range(1, width.bit_length())] + [(0, 1 << s) for s in range(1, height.bit_length())]
+        for i, (horizontal, subtransform) in enumerate(passes):
+            last = i == len(passes) - 1
+            fbo = output if last and output else self.work_fbos[1 - current]
+            self._draw("fft", fbo, tex=(self.work[current], 0), horizontal=horizontal, subtransform=subtransform,
+                       direction=direction, scale=scale if last else 1.0)
+            current = 1 - current
+        return current
+
+    def _draw(self, name, fbo, **uniforms):
+        # Uniform values given as (texture, unit) bind a sampler
+        program = self.programs[name]
+        for uniform, value in uniforms.items():
+            if isinstance(value, tuple) and isinstance(value[0], moderngl.Texture):
+                value[0].use(value[1])
+                value = value[1]
+            if uniform in program:
+                program[uniform].value = value
+        fbo.use()
+        self.ctx.viewport = (0, 0) + tuple(fbo.size)
+        self.vaos[name].render(moderngl.TRIANGLE_STRIP)
+
+    def _allocate(self, size, ri, ra):
+        if not self.work or self.work[0].size != tuple(size):
+            for resource in self.work + self.work_fbos:
+                resource.release()
+            self.work = [self.ctx.texture(size, 2, dtype='f4') for _ in range(2)]
+            self.work_fbos = [self.ctx.framebuffer(color_attachments=[texture]) for texture in self.work]
+        key = (tuple(size), ri, ra)
+        if key != self.kernel_key:
+            if self.kernels is None or self.kernels.size != tuple(size):
+                if self.kernels:
+                    self.kernels.release()
+                self.kernels = self.ctx.texture(size, 4, dtype='f4')
+            self.kernels.write(disk_kernels(size, ri, ra))
+            self.kernel_key = key
@@ -1,16 +1,30 @@
 import sys
 import time
-import numpy as np
-import cv2
+from collections import deque
 from PySide6 import QtCore, QtWidgets, QtOpenGLWidgets, QtGui
 import moderngl
-from renderer import Renderer
+from renderer import Renderer, animate_params, capture_components
 from shaders import SHADERS
+from settings import load_settings
+from video_encoder import VideoEncoder
+from dynamic_resolution import DynamicResolution
+from profiling import Profiler
+from readback import PBORing
+from timeline import InputTimeline
+from replay_buffer import ReplayBuffer
+from hashlife import HashLife, HashLifeRunner, load_rle, random_soup
+import tracing
 
 
 class GLWidget(QtOpenGLWidgets.QOpenGLWidget):
-    def __init__(self, parent=None):
+    # Emitted once the startup warm-up is done, with (shader name, error) for each failure
+    warmup_finished = QtCore.Signal(list)
+    # Emitted once with the message when the HashLife worker stops on an error
+    hashlife_failed = QtCore.Signal(str)
+
+    def __init__(self, parent=None, settings=None):
         super().__init__(parent)
+        self.settings = settings or load_settings()
         self.renderer = None
         self.current_shader_name = "Default"
         self.start_time = time.time()
@@ -23,7 +37,61 @@ class GLWidget(QtOpenGLWidgets.QOpenGLWidget):
         self.offset_y = 0.0
         self.is_recording = False
         self.auto_animate = False
-        self.frames = []
+        # Internal render scale and simulation grid size, independent of the output size
+        self.render_scale = self.settings["render_scale"]
+        sim_size = self.settings["sim_grid_size"]
+        self.sim_size = (sim_size, sim_size) if sim_size else None
+        self.sim_steps = self.settings["sim_steps"]
+        self.sparse_tiles = self.settings["sparse_tiles"]
+        self.gl_debug = self.settings["gl_debug"]
+        self.kernel_radii = (self.settings["kernel_ri"], self.settings["kernel_ra"])
+        # Dynamic resolution lowers the render scale below render_scale to hold the frame budget
+        self.dynamic_resolution = self.settings["dynamic_resolution"]
+        self.resolution_controller = DynamicResolution(
+            self.settings["target_frame_ms"], min_scale=self.settings["dynamic_min_scale"], max_scale=self.render_scale
+        )
+        self.last_paint = None
+
+        # Per-pass GPU timings and CPU spans over a rolling window, see Profiler.stats()
+        self.profiler = None
+        self.last_profile_report = time.perf_counter()
+        self.last_frame_start = None
+
+        # Performance overlay; unless hud_in_recordings is set it is drawn after capture
+        self.hud_visible = self.settings["hud"]
+        # CPU HashLife engine, running while its entry is selected in the shader menu
+        self.hashlife = None
+        self.hashlife_error_reported = False
+        self.hashlife_pattern = self.settings["hashlife_pattern"]
+        self.hashlife_step_exponent = self.settings["hashlife_step_exponent"]
+        self.encoder = None
+        self.readback = None
+
+        # Recording renders offscreen at a fixed size on a fixed time step
+        self.record_size = self.settings["record_size"]
+        self.record_fps = self.settings["record_fps"]
+        self.record_fbo = None
+        self.record_frame_size = None
+        self.record_frame_index = 0
+        self.record_time_origin = 0.0
+
+        # Always-on instant replay of the last few seconds
+        self.replay_enabled = self.settings["replay_enabled"]
+        self.replay = None
+        self.replay_readback = None
+        self.replay_timestamps = []
+        self.last_replay_capture = 0.0
+
+        # Shaders still waiting to be compiled by the startup warm-up
+        self.warmup_queue = deque()
+        self.warmup_results = []
+        # Cleared once a shader's programs no longer fit in the cache without evicting others
+        self.warmup_keep = True
+        self.painted_once = False
+
+        # Optional log of inputs for re-rendering the session offline
+        self.timeline = None
+        self.timeline_start = 0.0
 
     def initializeGL(self):
         print("Initializing GL...")
@@ -39,13 +107,20 @@ class GLWidget(QtOpenGLWidgets.QOpenGLWidget):
             print(f"Renderer: {self.ctx.info['GL_RENDERER']}")
             print(f"FBO detected: {self.fbo}")
 
-            self.renderer = Renderer(self.ctx)
+            self.profiler = Profiler(self.ctx, window=self.settings["profile_window"])
+            self.renderer = Renderer(self.ctx, program_cache_size=self.settings["program_cache_size"], profiler=self.profiler)
+            self.renderer.sim_dt = self.settings["sim_dt"]
             # Set initial shader
-            success, msg = self.renderer.update_shader(SHADERS["Default"])
+            success, msg = self.renderer.load_shader("Default")
             if not success:
                 print(f"Initial shader error: {msg}")
             else:
                 print("Initial shader loaded successfully")
+
+            if self.settings["warmup_shaders"]:
+                priority = [name for name in self.settings["warmup_priority"] if name in SHADERS]
+                order = priority + [name for name in SHADERS if name not in priority]
+                self.warmup_queue = deque(name for name in order if name != "Default")
         except Exception as e:
             print(f"Failed to initialize GL: {e}")
             import traceback
@@ -53,22 +128,35 @@ class GLWidget(QtOpenGLWidgets.QOpenGLWidget):
 
     def paintGL(self):
         if self.renderer:
+            paint_start = time.perf_counter()
+            self.profiler.next_frame()
+            if self.hashlife and self.hashlife.error and not self.hashlife_error_reported:
+                self.hashlife_error_reported = True
+                self.hashlife_failed.emit(self.hashlife.error)
+            if self.last_frame_start is not None:
+                self.profiler.record("frame", (paint_start - self.last_frame_start) * 1000.0)
+            self.last_frame_start = paint_start
+            hud_in_output = self.hud_visible and self.settings["hud_in_recordings"]
             try:
                 # Detect the current framebuffer for this paint call
                 fbo = self.ctx.detect_framebuffer()
 
-                current_time = time.time() - self.start_time
+                current_time = self.frame_time()
+
+                if self.timeline:
+                    self.timeline.sample(
+                        time.time() - self.timeline_start, current_time,
+                        shader=self.current_shader_name, zoom=self.zoom,
+                        offset_x=self.offset_x, offset_y=self.offset_y,
+                        auto_animate=self.auto_animate
+                    )
 
                 # Apply auto-animation if enabled
                 render_zoom = self.zoom
                 render_offset = (self.offset_x, self.offset_y)
 
                 if self.auto_animate:
-                    render_zoom *= (1.0 + 0.5 * np.sin(current_time * 0.5))
-                    render_offset = (
-                        self.offset_x + 0.2 * np.cos(current_time * 0.3),
-                        self.offset_y + 0.2 * np.sin(current_time * 0.4)
-                    )
+                    render_zoom, render_offset = animate_params(render_zoom, render_offset, current_time)
 
                 # Use physical pixels for resolution
                 ratio = self.devicePixelRatio()
@@ -77,31 +165,308 @@ class GLWidget(QtOpenGLWidgets.QOpenGLWidget):
 
                 # Update viewport to match physical pixels
                 self.ctx.viewport = (0, 0, w, h)
+                self.renderer.render_scale = self.render_scale
+                if self.dynamic_resolution and not self.is_recording:
+                    self.renderer.render_scale = self.resolution_controller.scale
+                self.renderer.sim_size = self.sim_size
+                self.renderer.sim_steps = self.sim_steps
+                self.renderer.executor.sparse = self.sparse_tiles
+                self.renderer.kernel_radii = self.kernel_radii
 
-                # Check if current shader needs feedback
-                is_feedback = self.current_shader_name in ["Game of Life", "Smooth Life", "Flame", "Reaction Diffusion", "Slime Mold", "Cellular Automata 3D", "GPU Fire", "Smoke / Ink", "Droplet Ripples", "Flow Field Simulation"]
+                if self.is_recording:
+                    # Render the full-size frame offscreen and show a downscaled copy
+                    if self.record_fbo is None:
+                        self.record_fbo = self.ctx.framebuffer(color_attachments=[self.ctx.texture(self.record_frame_size, 4)])
+                    self.renderer.render(current_time, self.record_frame_size, zoom=render_zoom, offset=render_offset, fbo=self.record_fbo)
+                    self.record_frame_index += 1
+                    with self.renderer.timed("render/preview"):
+                        self.renderer.present(self.record_fbo.color_attachments[0], fbo)
+                else:
+                    self.renderer.render(current_time, res, zoom=render_zoom, offset=render_offset, fbo=fbo)
+                    if self.dynamic_resolution:
+                        self._update_dynamic_resolution()
 
-                self.renderer.render(current_time, res, zoom=render_zoom, offset=render_offset, fbo=fbo, is_feedback=is_feedback)
+                if hud_in_output:
+                    # Burn the HUD into the recorded (or replayed) frame
+                    if self.is_recording and self.record_fbo:
+                        self._draw_hud(self.record_fbo, self.record_frame_size)
+                    else:
+                        self._draw_hud(fbo, res)
 
-                # Check for GL errors
-                err = self.ctx.error
-                if err != 'no_error':
-                    # Only print if it's not no_error
-                    pass
+                if self.gl_debug:
+                    # glGetError waits for the GPU, so it is only checked when debugging
+                    err = self.ctx.error
+                    if err != 'GL_NO_ERROR':
+                        print(f"GL error: {err}")
             except Exception as e:
                 print(f"Render error: {e}")
 
-            if self.is_recording:
-                # Read pixels for recording from the current framebuffer
-                data = fbo.read(components=3)
-                # Ensure we have enough data before reshaping
-                if len(data) == w * h * 3:
-                    image = np.frombuffer(data, dtype='u1').reshape(h, w, 3)
-                    image = np.flipud(image)
-                    image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
-                    self.frames.append(image)
-                    if len(self.frames) % 60 == 0:
-                        print(f"Captured {len(self.frames)} frames...")
+            if self.is_recording and self.record_fbo:
+                # Flip and convert on the GPU so the read bytes go to the encoder untouched
+                layout = self.encoder.pixel_format
+                capture_fbo = self.renderer.capture(self.record_fbo.color_attachments[0], layout)
+                fbo.use()
+
+                # Queue an asynchronous read; the ring hands back a frame from a few paints ago
+                if self.readback is None or self.readback.size != capture_fbo.size:
+                    self._flush_readback()
+                    self.readback = PBORing(self.ctx, capture_fbo.size, components=capture_components(layout), depth=self.settings["readback_ring_depth"])
+                with self.renderer.timed("readback/record"), self.profiler.cpu("cpu/readback"):
+                    frame = self.readback.push(capture_fbo)
+                if frame is not None:
+                    with self.profiler.cpu("cpu/encoder_submit"):
+                        self._submit_frame(frame)
+
+            if self.replay_enabled:
+                source = self.record_fbo.color_attachments[0] if self.is_recording and self.record_fbo else fbo
+                with self.profiler.cpu("cpu/replay"):
+                    self._capture_replay(source, w, h)
+                fbo.use()
+
+            # Warm up shaders in idle time once the first frame is on screen
+            if self.warmup_queue and self.painted_once:
+                with self.profiler.cpu("cpu/warmup"):
+                    self._run_warmup()
+                fbo.use()
+            self.painted_once = True
+
+            # Drawn last so neither the recording nor the replay buffer sees it
+            if self.hud_visible and not (hud_in_output and not self.is_recording):
+                self._draw_hud(fbo, (w, h))
+
+            self.profiler.record("cpu/paint", (time.perf_counter() - paint_start) * 1000.0)
+            tracing.complete("paintGL", paint_start, category="frame", frame=self.profiler.frame)
+            interval = self.settings["profile_report_seconds"]
+            if interval and time.perf_counter() - self.last_profile_report >= interval:
+                self.last_profile_report = time.perf_counter()
+                print(self.profiler.report())
+
+    def _draw_hud(self, fbo, size):
+        lines = []
+        frame = self.profiler.stats("frame").get("frame")
+        if frame:
+            lines.append(f"FPS {1000.0 / frame['mean']:.1f}  FRAME {frame['mean']:.1f} MS")
+            lines.append(f"P50 {frame['p50']:.1f} P95 {frame['p95']:.1f} P99 {frame['p99']:.1f}")
+        else:
+            lines += ["FPS -", "P50 - P95 - P99 -"]
+
+        gpu_ms = self.profiler.gpu_total()
+        cpu_samples = self.profiler.samples.get("cpu/paint")
+        gpu_text = f"{gpu_ms:.1f}" if gpu_ms is not None else "-"
+        cpu_text = f"{cpu_samples[-1]:.1f}" if cpu_samples else "-"
+        lines.append(f"GPU {gpu_text} MS  CPU {cpu_text} MS")
+
+        if self.renderer.render_size:
+            width, height = self.renderer.render_size
+            lines.append(f"RES {width}X{height} ({self.renderer.render_scale * 100:.0f}%)")
+        tile_ratios = self.renderer.executor.tile_ratios
+        if tile_ratios and self.sparse_tiles and not self.hashlife:
+            lines.append("TILES " + " ".join(f"{ratio * 100:.0f}%" for ratio in tile_ratios.values()))
+        if self.hashlife:
+            life = self.hashlife.life
+            lines.append(f"GEN {life.generation} (+{1 << self.hashlife.step_exponent})")
+            lines.append(f"NODES {life.count} STEP {self.hashlife.step_ms:.1f} MS")
+            if self.hashlife.error:
+                lines.append("HASHLIFE STOPPED ON AN ERROR")
+        if self.is_recording and self.encoder:
+            lines.append(f"REC QUEUE {self.encoder.pending()}/{self.settings['record_queue_size']}")
+        else:
+            lines.append("REC OFF")
+
+        scale = max(1, round(2 * self.devicePixelRatio()))
+        self.renderer.draw_hud(fbo, size, lines, self.profiler.samples.get("frame", ()), self.settings["target_frame_ms"], scale)
+
+    def _update_dynamic_resolution(self):
+        # GPU time of the render passes when timer queries work, otherwise the interval between paints
+        now = time.perf_counter()
+        frame_ms = self.profiler.gpu_total("render/")
+        if not self.profiler.gpu_available and self.last_paint is not None:
+            frame_ms = (now - self.last_paint) * 1000.0
+        self.last_paint = now
+
+        controller = self.resolution_controller
+        controller.max_scale = self.render_scale
+        controller.scale = min(controller.scale, self.render_scale)
+        previous = controller.scale
+        scale = controller.update(frame_ms)
+        if scale != previous:
+            print(f"Dynamic resolution: scale {previous:.2f} -> {scale:.2f} ({controller.average_ms:.1f} ms average)")
+
+    def start_hashlife(self):
+        # (Re)start the HashLife engine on the configured pattern, or a random soup
+        self.stop_hashlife()
+        life = HashLife(max_nodes=self.settings["hashlife_max_nodes"])
+        if self.hashlife_pattern:
+            cells = load_rle(self.hashlife_pattern)
+        else:
+            cells = random_soup(self.settings["hashlife_soup_size"])
+        # Centre the pattern on the origin
+        if len(cells):
+            cells = cells - (cells.min(axis=0) + cells.max(axis=0)) // 2
+        life.set_cells(cells)
+        print(f"HashLife: {len(cells)} live cells, root level {life.level[life.root]}")
+        self.hashlife = HashLifeRunner(life, self.hashlife_step_exponent)
+        self.hashlife_error_reported = False
+        self.renderer.hashlife = self.hashlife
+
+    def stop_hashlife(self):
+        if self.hashlife:
+            self.hashlife.stop()
+            self.hashlife = None
+            self.renderer.hashlife = None
+
+    def set_hashlife_step_exponent(self, exponent):
+        self.hashlife_step_exponent = exponent
+        if self.hashlife:
+            self.hashlife.step_exponent = exponent
+
+    def set_dynamic_resolution(self, enabled):
+        self.dynamic_resolution = enabled
+        self.resolution_controller.max_scale = self.render_scale
+        self.resolution_controller.reset()
+        self.last_paint = None
+
+    def _run_warmup(self):
+        budget = self.settings["warmup_budget_ms"] / 1000.0
+        start = time.perf_counter()
+        cache = self.renderer.program_cache
+        while self.warmup_queue:
+            name = self.warmup_queue.popleft()
+            # Once a shader's graph does not fit in the cache, it and every later shader are only
+            # checked for errors, so warming never evicts a program
+            self.warmup_keep = self.warmup_keep and len(cache.entries) + self.renderer.uncached_programs(name) <= cache.size
+            keep = self.warmup_keep
+            success, seconds, msg = self.renderer.warm_shader(name, keep=keep)
+            self.warmup_results.append((name, success, seconds, msg))
+            status = "ok" if success else f"FAILED: {msg}"
+            print(f"Warm-up: {name} {seconds * 1000:.0f} ms {status}")
+            if time.perf_counter() - start >= budget:
+                break
+
+        if not self.warmup_queue:
+            total = sum(seconds for _, _, seconds, _ in self.warmup_results)
+            failures = [(name, msg) for name, success, _, msg in self.warmup_results if not success]
+            print(f"Warm-up finished: {len(self.warmup_results)} shaders in {total:.2f}s, {len(failures)} failed")
+            self.warmup_finished.emit(failures)
+
+    def _capture_replay(self, source, w, h):
+        # Sample at replay_fps rather than every paint to stretch the buffer further
+        now = time.time()
+        if now - self.last_replay_capture < 0.999 / self.settings["replay_fps"]:
+            return
+        self.last_replay_capture = now
+
+        scale = self.settings["replay_scale"]
+        size = (max(2, int(w * scale)) & ~1, max(2, int(h * scale)) & ~1)
+        frame_shape = (size[1] * 3 // 2, size[0])
+        if self.replay is None or self.replay.frame_shape != frame_shape:
+            # The buffer is preallocated for one frame size; a resize starts it over
+            self._release_replay_readback()
+            self.replay = ReplayBuffer(self.settings["replay_seconds"], self.settings["replay_fps"], frame_shape)
+            print(f"Replay buffer: {self.replay.capacity} frames at {size[0]}x{size[1]}, {self.replay.nbytes / 1e6:.0f} MB")
+
+        capture_fbo = self.renderer.capture(source, "i420", size=size, slot="replay")
+        if self.replay_readback is None:
+            self.replay_readback = PBORing(self.ctx, capture_fbo.size, components=1, depth=self.settings["readback_ring_depth"])
+        self.replay_timestamps.append(now)
+        with self.renderer.timed("readback/replay"):
+            frame = self.replay_readback.push(capture_fbo)
+        if frame is not None:
+            self.replay.push(frame, self.replay_timestamps.pop(0))
+
+    def _release_replay_readback(self):
+        if self.replay_readback:
+            self.replay_readback.release()
+            self.replay_readback = None
+        self.replay_timestamps = []
+
+    def set_replay_enabled(self, enabled):
+        self.replay_enabled = enabled
+        if not enabled:
+            # Free the preallocated frames right away
+            self.makeCurrent()
+            try:
+                self._release_replay_readback()
+            finally:
+                self.doneCurrent()
+            self.replay = None
+
+    def reset_clock(self):
+        self.start_time = time.time()
+        if self.is_recording:
+            self.record_time_origin = -self.record_frame_index / self.record_fps
+
+    def frame_time(self):
+        # While recording, time advances by exactly one frame per paint so the video is
+        # correctly timed even when rendering runs slower than real time
+        if self.is_recording:
+            return self.record_time_origin + self.record_frame_index / self.record_fps
+        return time.time() - self.start_time
+
+    def _submit_frame(self, image):
+        # Frames stream to the encoder thread, so memory stays bounded by the queue size
+        self.encoder.write(image)
+        if self.encoder.frames_submitted % 60 == 0:
+            print(f"Captured {self.encoder.frames_submitted} frames ({self.encoder.pending()} queued)...")
+
+    def _flush_readback(self):
+        if self.readback:
+            for frame in self.readback.drain():
+                self._submit_frame(frame)
+            self.readback.release()
+            self.readback = None
+
+    def start_timeline(self):
+        self.timeline = InputTimeline()
+        self.timeline_start = time.time()
+
+    def stop_timeline(self):
+        timeline, self.timeline = self.timeline, None
+        if timeline:
+            timeline.finish(time.time() - self.timeline_start)
+        return timeline
+
+    def start_recording(self, path):
+        if self.record_size:
+            width, height = self.record_size
+        else:
+            ratio = self.devicePixelRatio()
+            width, height = int(self.width() * ratio), int(self.height() * ratio)
+        # Even dimensions keep the frame valid for 4:2:0 encoders
+        self.record_frame_size = (width & ~1, height & ~1)
+        self.record_time_origin = self.frame_time()
+        self.record_frame_index = 0
+        # Record into intra-only MJPG so the export can seek to any frame and encode in parallel chunks
+        self.encoder = VideoEncoder(
+            path, float(self.record_fps),
+            queue_size=self.settings["record_queue_size"],
+            backpressure=self.settings["record_backpressure"],
+            pixel_format=self.settings["capture_format"],
+            backend="opencv",
+            fourcc="MJPG",
+            quality=95
+        )
+        self.is_recording = True
+
+    def stop_recording(self):
+        # Flushes the queue and finalizes the file; returns the encoder for its statistics
+        self.is_recording = False
+        # Collect the frames still in flight in the readback ring
+        self.makeCurrent()
+        try:
+            self._flush_readback()
+            if self.record_fbo:
+                self.record_fbo.color_attachments[0].release()
+                self.record_fbo.release()
+                self.record_fbo = None
+        finally:
+            self.doneCurrent()
+        # Resume the live clock where the recording left off
+        self.start_time = time.time() - (self.record_time_origin + self.record_frame_index / self.record_fps)
+        encoder, self.encoder = self.encoder, None
+        if encoder:
+            encoder.close()
+        return encoder
 
     def resizeGL(self, w, h):
         self.ctx.viewport = (0, 0, w, h)
\ No newline at end of file
@@ -0,0 +1,373 @@
+import re
+import threading
+import time
+
+import numpy as np
+
+import tracing
+
+# Entry in the shader menu that switches the view to the CPU engine
+SHADER_NAME = "HashLife"
+
+# Nodes 0 and 1 are the dead and the live cell. Nodes 2-17 are the 16 possible 2x2 blocks,
+# node BLOCKS + code for code = nw | ne << 1 | sw << 2 | se << 3
+ALIVE = 1
+BLOCKS = 2
+# Coordinates stay within int64 up to this level
+MAX_LEVEL = 60
+
+
+def _life_table():
+    # Next state of the centre 2x2 of every 4x4 block under B3/S23, as a block code. The
+    # block's key holds its nw, ne, sw and se 2x2 codes in bits 0-3, 4-7, 8-11 and 12-15.
+    keys = np.arange(1 << 16)
+    grid = np.zeros((len(keys), 4, 4), dtype='i4')
+    for y in range(4):
+        for x in range(4):
+            bit = ((y >> 1) * 2 + (x >> 1)) * 4 + (y & 1) * 2 + (x & 1)
+            grid[:, y, x] = (keys >> bit) & 1
+    codes = np.zeros(len(keys), dtype='i4')
+    for y in (1, 2):
+        for x in (1, 2):
+            neighbours = grid[:, y - 1:y + 2, x - 1:x + 2].sum(axis=(1, 2)) - grid[:, y, x]
+            alive = (neighbours == 3) | ((grid[:, y, x] == 1) & (neighbours == 2))
+            codes |= alive.astype('i4') << ((y - 1) * 2 + (x - 1))
+    return codes
+
+
+def _palette():
+    # Colours by the fraction of live cells under a pixel
+    t = np.linspace(0.0, 1.0, 256)[:, None]
+    col = (0.5 + 0.5 * np.cos(6.28318 * (t * 0.6 + np.array([0.0, 0.33, 0.67])))) * np.sqrt(t)
+    col += np.array([0.01, 0.02, 0.03])
+    rgba = np.ones((256, 4))
+    rgba[:, :3] = np.clip(col, 0.0, 1.0)
+    return (rgba * 255).astype('u1')
+
+
+PALETTE = _palette()
+
+
+def parse_rle(text):
+    # Live cell coordinates (N x 2, x right and y down) of a pattern in RLE format
+    cells = []
+    x = y = 0
+    body = "".join(line.strip() for line in text.splitlines() if line.strip() and not line.startswith(("#", "x")))
+    for count, tag in re.findall(r"(\d*)([a-zA-Z$!])", body):
+        count = int(count) if count else 1
+        if tag == "!":
+            break
+        if tag == "$":
+            x = 0
+            y += count
+        elif tag == "b":
+            x += count
+        else:
+            cells.extend((x + i, y) for i in range(count))
+            x += count
+    return np.array(cells, dtype='i8').reshape(-1, 2)
+
+
+def load_rle(path):
+    with open(path) as f:
+        return parse_rle(f.read())
+
+
+def random_soup(size, density=0.25, seed=None):
+    # A square of random cells
+    rng = np.random.default_rng(seed)
+    ys, xs = np.nonzero(rng.random((size, size)) < density)
+    return np.stack([xs, ys], axis=1).astype('i8')
+
+
+class HashLife:
+    # Game of Life on a memoized quadtree (HashLife). A level-n node covers 2^n x 2^n cells and
+    # points at its four level n-1 children in NumPy tables. Nodes are canonical, so equal
+    # subtrees are stored once, and the result of advancing a node is cached, so repeated
+    # regions (in space or time) are computed once. The root grows with the pattern, centred on
+    # the origin. Once the tables pass `max_nodes`, everything unreachable from the root is
+    # evicted along with the result cache.
+    def __init__(self, max_nodes=2000000, capacity=1 << 16):
+        self.max_nodes = max_nodes
+        self.children = np.zeros((capacity, 4), dtype='i8')
+        self.level = np.zeros(capacity, dtype='i1')
+        self.population = np.zeros(capacity, dtype='f8')
+        self.count = 2
+        self.population[ALIVE] = 1.0
+        # (nw, ne, sw, se) -> node
+        self.index = {}
+        # (node, j) -> centre of the node advanced 2^j generations
+        self.results = {}
+        self.rule = _life_table()
+        self.collections = 0
+        for code in range(16):
+            self.join(code & 1, (code >> 1) & 1, (code >> 2) & 1, (code >> 3) & 1)
+        # Empty node of each level
+        self.empty = [0]
+        self.generation = 0
+        self.root = self._empty(3)
+
+    def join(self, nw, ne, sw, se):
+        key = (nw, ne, sw, se)
+        node = self.index.get(key)
+        if node is not None:
+            return node
+        if self.count == len(self.level):
+            self._grow()
+        node = self.count
+        self.children[node] = key
+        self.level[node] = self.level[nw] + 1
+        self.population[node] = self.population[nw] + self.population[ne] + self.population[sw] + self.population[se]
+        self.index[key] = node
+        self.count += 1
+        return node
+
+    def set_cells(self, cells):
+        # Replace the universe with live cells at integer (x, y) coordinates
+        cells = np.unique(np.asarray(cells, dtype='i8').reshape(-1, 2), axis=0)
+        self.results = {}
+        self.generation = 0
+        extent = int(np.abs(cells).max()) + 1 if len(cells) else 1
+        level = max(3, extent.bit_length() + 1)
+        if not len(cells):
+            self.root = self._empty(level)
+            return
+
+        # Merge nodes bottom-up: each round groups the nodes by their parent's position
+        xs, ys = cells[:, 0] + (1 << (level - 1)), cells[:, 1] + (1 << (level - 1))
+        nodes = np.full(len(cells), ALIVE, dtype='i8')
+        for child_level in range(level):
+            quadrant = (ys & 1) * 2 + (xs & 1)
+            xs, ys = xs >> 1, ys >> 1
+            parents, first, inverse = np.unique(ys * (1 << (level - child_level)) + xs, return_index=True, return_inverse=True)
+            kids = np.full((len(parents), 4), self._empty(child_level), dtype='i8')
+            kids[inverse.ravel(), quadrant] = nodes
+            nodes = np.array([self.join(*row) for row in kids.tolist()], dtype='i8')
+            xs, ys = xs[first], ys[first]
+        self.root = int(nodes[0])
+
+    def advance(self, k):
+        # Advance the universe by 2^k generations
+        root = self.root
+        while self.level[root] < k + 3 or not self._padded(root):
+            root = self._expand(root)
+        if self.level[root] > MAX_LEVEL:
+            raise OverflowError("Pattern grew beyond the coordinate range")
+        self.root = self._successor(root, k)
+        self.generation += 1 << k
+        if self.count > self.max_nodes:
+            self.collect()
+
+    def collect(self):
+        # Evict every node the root does not reach, plus all cached results
+        count = self.count
+        marked = np.zeros(count, dtype=bool)
+        marked[:BLOCKS + 16] = True
+        marked[self.empty] = True
+        marked[self.root] = True
+        level = self.level[:count]
+        for lvl in range(int(level.max()), 1, -1):
+            marked[self.children[:count][marked & (level == lvl)].ravel()] = True
+
+        keep = np.nonzero(marked)[0]
+        remap = np.cumsum(marked) - 1
+        self.count = len(keep)
+        self.children[:self.count] = remap[self.children[keep]]
+        self.children[:BLOCKS] = 0
+        self.level[:self.count] = self.level[keep]
+        self.population[:self.count] = self.population[keep]
+        self.index = dict(zip(map(tuple, self.children[BLOCKS:self.count].tolist()), range(BLOCKS, self.count)))
+        self.results = {}
+        self.empty = [int(remap[node]) for node in self.empty]
+        self.root = int(remap[self.root])
+        self.collections += 1
+        print(f"HashLife: evicted {count - self.count} nodes, {self.count} remain")
+
+    def bounds(self):
+        # (x0, y0, x1, y1) around the live cells, to within 1/256 of the root, or None if empty
+        if not self.population[self.root]:
+            return None
+        nodes, xs, ys, size = self._descend(max(0, int(self.level[self.root]) - 8))
+        return int(xs.min()), int(ys.min()), int(xs.max()) + size, int(ys.max()) + size
+
+    def rasterize(self, x0, y0, width, height, s):
+        # Fraction of live cells in each 2^s x 2^s block of the window starting at cell (x0, y0),
+        # which must lie on a multiple of 2^s, as a (height, width) float32 array
+        image = np.zeros((height, width), dtype='f4')
+        window = (x0, y0, x0 + (width << s), y0 + (height << s))
+        nodes, xs, ys, size = self._descend(s, window)
+        columns, rows = (xs - x0) >> s, (ys - y0) >> s
+        inside = (columns >= 0) & (columns < width) & (rows >= 0) & (rows < height)
+        image[rows[inside], columns[inside]] = self.population[nodes[inside]] / float(size) ** 2
+        return image
+
+    def render(self, size, zoom=1.0, offset=(0.0, 0.0)):
+        # RGBA image of `size` (rows bottom-up, ready for upload). At zoom 1 the view fits the
+        # pattern, smaller zooms magnify it as in the shaders; offset pans by up to the pattern's extent.
+        width, height = size
+        bounds = self.bounds() or (-1, -1, 1, 1)
+        extent = max(bounds[2] - bounds[0], bounds[3] - bounds[1], 16) * 1.1
+        cells_per_pixel = extent * zoom / min(width, height)
+        centre_x = (bounds[0] + bounds[2]) / 2.0 + offset[0] * extent / 2.0
+        centre_y = (bounds[1] + bounds[3]) / 2.0 - offset[1] * extent / 2.0
+
+        # Rasterize at the smallest power-of-two block that is at least a pixel, then sample it
+        s = max(0, int(np.ceil(np.log2(cells_per_pixel)))) if cells_per_pixel > 1 else 0
+        left = centre_x - width * cells_per_pixel / 2.0
+        top = centre_y - height * cells_per_pixel / 2.0
+        x0 = int(np.floor(left)) >> s << s
+        y0 = int(np.floor(top)) >> s << s
+        columns = ((left + (np.arange(width) + 0.5) * cells_per_pixel - x0) / (1 << s)).astype('i8')
+        rows = ((top + (np.arange(height)[::-1] + 0.5) * cells_per_pixel - y0) / (1 << s)).astype('i8')
+        density = self.rasterize(x0, y0, int(columns[-1]) + 1, int(rows[0]) + 1, s)
+        return PALETTE[(density[rows[:, None], columns[None, :]] * 255).astype('u1')]
+
+    def _descend(self, s, window=None):
+        # Live nodes of level s (or the root, if smaller) that overlap the window, with their
+        # top-left cell coordinates and size in cells
+        level = int(self.level[self.root])
+        half = 1 << (level - 1)
+        nodes, xs, ys = np.array([self.root]), np.array([-half], dtype='i8'), np.array([-half], dtype='i8')
+        for lvl in range(level, s, -1):
+            size = 1 << lvl
+            keep = self.population[nodes] > 0
+            if window:
+                keep &= (xs < window[2]) & (xs + size > window[0]) & (ys < window[3]) & (ys + size > window[1])
+            nodes, xs, ys = nodes[keep], xs[keep], ys[keep]
+            half = size >> 1
+            nodes = self.children[nodes].ravel()
+            xs = (xs[:, None] + np.array([0, half, 0, half])).ravel()
+            ys = (ys[:, None] + np.array([0, 0, half, half])).ravel()
+        keep = self.population[nodes] > 0
+        return nodes[keep], xs[keep], ys[keep], 1 << min(level, s)
+
+    def _successor(self, node, j):
+        # Centre of a level-n node advanced 2^j generations, j <= n - 2
+        level = int(self.level[node])
+        j = min(j, level - 2)
+        key = (node, j)
+        result = self.results.get(key)
+        if result is not None:
+            return result
+
+        if not self.population[node]:
+            result = self._empty(level - 1)
+        elif level == 2:
+            a, b, c, d = self.children[node].tolist()
+            result = BLOCKS + int(self.rule[(a - BLOCKS) | (b - BLOCKS) << 4 | (c - BLOCKS) << 8 | (d - BLOCKS) << 12])
+        else:
+            a, b, c, d = self.children[node].tolist()
+            aa, ab, ac, ad = self.children[a].tolist()
+            ba, bb, bc, bd = self.children[b].tolist()
+            ca, cb, cc, cd = self.children[c].tolist()
+            da, db, dc, dd = self.children[d].tolist()
+            # Nine overlapping sub-squares, each advanced 2^j (or half of the way at full speed)
+            c1 = self._successor(a, j)
+            c2 = self._successor(self.join(ab, ba, ad, bc), j)
+            c3 = self._successor(b, j)
+            c4 = self._successor(self.join(ac, ad, ca, cb), j)
+            c5 = self._successor(self.join(ad, bc, cb, da), j)
+            c6 = self._successor(self.join(bc, bd, da, db), j)
+            c7 = self._successor(c, j)
+            c8 = self._successor(self.join(cb, da, cd, dc), j)
+            c9 = self._successor(d, j)
+            if j < level - 2:
+                # Already advanced far enough; assemble the centre from their inner quadrants
+                result = self.join(
+                    self.join(self._child(c1, 3), self._child(c2, 2), self._child(c4, 1), self._child(c5, 0)),
+                    self.join(self._child(c2, 3), self._child(c3, 2), self._child(c5, 1), self._child(c6, 0)),
+                    self.join(self._child(c4, 3), self._child(c5, 2), self._child(c7, 1), self._child(c8, 0)),
+                    self.join(self._child(c5, 3), self._child(c6, 2), self._child(c8, 1), self._child(c9, 0)),
+                )
+            else:
+                result = self.join(
+                    self._successor(self.join(c1, c2, c4, c5), j),
+                    self._successor(self.join(c2, c3, c5, c6), j),
+                    self._successor(self.join(c4, c5, c7, c8), j),
+                    self._successor(self.join(c5, c6, c8, c9), j),
+                )
+        self.results[key] = result
+        return result
+
+    def _child(self, node, quadrant):
+        return int(self.children[node, quadrant])
+
+    def _empty(self, level):
+        while len(self.empty) <= level:
+            e = self.empty[-1]
+            self.empty.append(self.join(e, e, e, e))
+        return self.empty[level]
+
+    def _expand(self, node):
+        # The same cells in a node of twice the size, centred
+        a, b, c, d = self.children[node].tolist()
+        e = self._empty(int(self.level[node]) - 1)
+        return self.join(self.join(e, e, e, a), self.join(e, e, b, e), self.join(e, c, e, e), self.join(d, e, e, e))
+
+    def _padded(self, node):
+        # Whether all live cells are within the central quarter (by width), so nothing can
+        # leave the node's centre while it is advanced by up to 2^(level - 3) generations
+        a, b, c, d = self.children[node].tolist()
+        inner = (self._child(self._child(a, 3), 3), self._child(self._child(b, 2), 2),
+                 self._child(self._child(c, 1), 1), self._child(self._child(d, 0), 0))
+        return self.population[[a, b, c, d]].sum() == self.population[list(inner)].sum()
+
+    def _grow(self):
+        capacity = len(self.level) * 2
+        self.children = np.resize(self.children, (capacity, 4))
+        self.level = np.resize(self.level, capacity)
+        self.population = np.resize(self.population, capacity)
+
+
+class HashLifeRunner:
+    # Runs a HashLife universe on a worker thread: each request(), typically one per displayed
+    # frame, advances it by 2^step_exponent generations and renders the requested view.
+    def __init__(self, life, step_exponent=3):
+        self.life = life
+        self.step_exponent = step_exponent
+        self.lock = threading.Lock()
+        self.requested = threading.Event()
+        self.view = None
+        self.image = None
+        self.step_ms = 0.0
+        self.error = None
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="HashLife", daemon=True)
+        self.thread.start()
+
+    def request(self, size, zoom=1.0, offset=(0.0, 0.0)):
+        with self.lock:
+            self.view = (tuple(size), zoom, tuple(offset))
+        self.requested.set()
+
+    def latest(self):
+        # The most recently rendered RGBA image, or None before the first one
+        with self.lock:
+            return self.image
+
+    def stop(self):
+        self.running = False
+        self.requested.set()
+        self.thread.join()
+
+    def _run(self):
+        while True:
+            self.requested.wait()
+            self.requested.clear()
+            if not self.running:
+                break
+            with self.lock:
+                view = self.view
+            try:
+                start = time.perf_counter()
+                with tracing.span("hashlife.advance", "hashlife", generations=1 << self.step_exponent):
+                    self.life.advance(self.step_exponent)
+                self.step_ms = (time.perf_counter() - start) * 1000.0
+                with tracing.span("hashlife.render", "hashlife"):
+                    image = self.life.render(*view)
+            except Exception as e:
+                self.error = str(e)
+                print(f"HashLife error: {e}")
+                break
+            with self.lock:
+                self.image = image
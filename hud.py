@@ -0,0 +1,129 @@
+import moderngl
+import numpy as np
+
+# 3x5 bitmap font, one string of rows per glyph; text is upper-cased before drawing
+GLYPHS = {
+    "0": ("111", "101", "101", "101", "111"), "1": ("010", "110", "010", "010", "111"),
+    "2": ("111", "001", "111", "100", "111"), "3": ("111", "001", "111", "001", "111"),
+    "4": ("101", "101", "111", "001", "001"), "5": ("111", "100", "111", "001", "111"),
+    "6": ("111", "100", "111", "101", "111"), "7": ("111", "001", "001", "001", "001"),
+    "8": ("111", "101", "111", "101", "111"), "9": ("111", "101", "111", "001", "111"),
+    "A": ("010", "101", "111", "101", "101"), "B": ("110", "101", "110", "101", "110"),
+    "C": ("111", "100", "100", "100", "111"), "D": ("110", "101", "101", "101", "110"),
+    "E": ("111", "100", "111", "100", "111"), "F": ("111", "100", "111", "100", "100"),
+    "G": ("111", "100", "101", "101", "111"), "H": ("101", "101", "111", "101", "101"),
+    "I": ("111", "010", "010", "010", "111"), "J": ("001", "001", "001", "101", "111"),
+    "K": ("101", "101", "110", "101", "101"), "L": ("100", "100", "100", "100", "111"),
+    "M": ("101", "111", "111", "101", "101"), "N": ("110", "101", "101", "101", "101"),
+    "O": ("111", "101", "101", "101", "111"), "P": ("111", "101", "111", "100", "100"),
+    "Q": ("111", "101", "101", "111", "001"), "R": ("110", "101", "110", "101", "101"),
+    "S": ("111", "100", "111", "001", "111"), "T": ("111", "010", "010", "010", "010"),
+    "U": ("101", "101", "101", "101", "111"), "V": ("101", "101", "101", "101", "010"),
+    "W": ("101", "101", "111", "111", "101"), "X": ("101", "101", "010", "101", "101"),
+    "Y": ("101", "101", "010", "010", "010"), "Z": ("111", "001", "010", "100", "111"),
+    ".": ("000", "000", "000", "000", "010"), ":": ("000", "010", "000", "010", "000"),
+    "/": ("001", "001", "010", "100", "100"), "%": ("101", "001", "010", "100", "101"),
+    "-": ("000", "000", "111", "000", "000"), "(": ("010", "100", "100", "100", "010"),
+    ")": ("010", "001", "001", "001", "010"), " ": ("000", "000", "000", "000", "000"),
+}
+FONT = {char: np.array([[c == "1" for c in row] for row in rows]) for char, rows in GLYPHS.items()}
+
+CHAR_WIDTH = 4
+LINE_HEIGHT = 7
+PADDING = 4
+GRAPH_HEIGHT = 32
+WIDTH = 160
+
+TEXT_COLOR = (235, 235, 235, 255)
+BACKGROUND = (0, 0, 0, 170)
+# Graph bars within budget, up to 1.5x over budget, and beyond
+BAR_COLORS = ((80, 220, 100, 255), (240, 200, 60, 255), (240, 70, 60, 255))
+BUDGET_LINE = (150, 150, 150, 255)
+
+HUD_VERTEX_SHADER = """
+    #version 330
+    uniform vec4 rect;
+    uniform vec2 viewport;
+    in vec2 in_vert;
+    in vec2 in_texcoord;
+    out vec2 v_texcoord;
+    void main() {
+        vec2 pixel = rect.xy + (in_vert * 0.5 + 0.5) * rect.zw;
+        gl_Position = vec4(pixel / viewport * 2.0 - 1.0, 0.0, 1.0);
+        // The image is composed top-down
+        v_texcoord = vec2(in_texcoord.x, 1.0 - in_texcoord.y);
+    }
+"""
+
+HUD_FRAGMENT_SHADER = """
+    #version 330
+    uniform sampler2D tex;
+    in vec2 v_texcoord;
+    out vec4 f_color;
+    void main() {
+        f_color = texture(tex, v_texcoord);
+    }
+"""
+
+
+class HUD:
+    # Performance overlay. The panel is composed on the CPU into a small RGBA image (text in a
+    # built-in bitmap font plus a frame-time graph), uploaded, and drawn as one blended quad.
+    def __init__(self, ctx, quad_buffer):
+        self.ctx = ctx
+        self.program = ctx.program(vertex_shader=HUD_VERTEX_SHADER, fragment_shader=HUD_FRAGMENT_SHADER)
+        self.vao = ctx.vertex_array(self.program, [(quad_buffer, '2f 2f', 'in_vert', 'in_texcoord')])
+        self.texture = None
+        self.image = None
+
+    def compose(self, lines, frame_times, budget_ms):
+        height = PADDING * 2 + len(lines) * LINE_HEIGHT + GRAPH_HEIGHT
+        if self.image is None or self.image.shape[0] != height:
+            self.image = np.empty((height, WIDTH, 4), dtype='u1')
+        image = self.image
+        image[:] = BACKGROUND
+
+        for row, line in enumerate(lines):
+            y = PADDING + row * LINE_HEIGHT
+            for column, char in enumerate(line.upper()[:(WIDTH - 2 * PADDING) // CHAR_WIDTH]):
+                glyph = FONT.get(char)
+                if glyph is None:
+                    continue
+                x = PADDING + column * CHAR_WIDTH
+                image[y:y + 5, x:x + 3][glyph] = TEXT_COLOR
+
+        # Scrolling frame-time graph, newest frame on the right; the budget sits at half height
+        bottom = height - PADDING
+        graph_width = WIDTH - 2 * PADDING
+        values = list(frame_times)[-graph_width:]
+        start = WIDTH - PADDING - len(values)
+        for x, value in enumerate(values, start):
+            bar = int(min(1.0, value / (2.0 * budget_ms)) * (GRAPH_HEIGHT - 2))
+            color = BAR_COLORS[0] if value <= budget_ms else BAR_COLORS[1] if value <= budget_ms * 1.5 else BAR_COLORS[2]
+            image[bottom - bar:bottom, x] = color
+        budget_row = bottom - (GRAPH_HEIGHT - 2) // 2
+        image[budget_row, PADDING:WIDTH - PADDING:2] = BUDGET_LINE
+        return image
+
+    def draw(self, fbo, size, lines, frame_times, budget_ms, scale=2):
+        # Draw the panel into the top-left corner of `fbo`, whose pixel size is `size`
+        image = self.compose(lines, frame_times, budget_ms)
+        height, width = image.shape[:2]
+        if self.texture is None or self.texture.size != (width, height):
+            if self.texture:
+                self.texture.release()
+            self.texture = self.ctx.texture((width, height), 4)
+            self.texture.filter = (moderngl.NEAREST, moderngl.NEAREST)
+        self.texture.write(image)
+
+        fbo.use()
+        self.ctx.viewport = (0, 0) + tuple(size)
+        margin = 8
+        self.program['rect'].value = (margin, size[1] - margin - height * scale, width * scale, height * scale)
+        self.program['viewport'].value = tuple(size)
+        self.program['tex'].value = 0
+        self.texture.use(0)
+        self.ctx.enable(moderngl.BLEND)
+        self.ctx.blend_func = moderngl.SRC_ALPHA, moderngl.ONE_MINUS_SRC_ALPHA
+        self.vao.render(moderngl.TRIANGLE_STRIP)
+        self.ctx.disable(moderngl.BLEND)
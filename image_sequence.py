@@ -0,0 +1,62 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# OpenCV only writes EXR when this is set before the first EXR call
+os.environ.setdefault("OPENCV_IO_ENABLE_OPENEXR", "1")
+
+import cv2
+import numpy as np
+
+IMAGE_FORMATS = ("png16", "exr")
+
+
+class ImageSequenceWriter:
+    # Writes float frames as 16-bit PNG or float EXR files. Compression and disk writes run
+    # on a thread pool (OpenCV releases the GIL), so they overlap with rendering.
+    def __init__(self, directory, image_format="png16", workers=None, prefix="frame_", png_compression=3):
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"Unknown image format '{image_format}'")
+
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.image_format = image_format
+        self.prefix = prefix
+        self.png_compression = png_compression
+        self.workers = workers or os.cpu_count() or 1
+        # Bound the frames waiting on the pool so memory stays flat
+        self.max_pending = self.workers * 2
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ImageWriter")
+        self.pending = deque()
+        self.frames_written = 0
+        self.start_time = time.perf_counter()
+
+    @property
+    def fps(self):
+        elapsed = time.perf_counter() - self.start_time
+        return self.frames_written / elapsed if elapsed > 0 else 0.0
+
+    def write(self, index, frame):
+        # `frame` is a bottom-up float RGB(A) image as read from the framebuffer
+        while len(self.pending) >= self.max_pending:
+            self.pending.popleft().result()
+        self.pending.append(self.pool.submit(self._write, index, frame))
+
+    def close(self):
+        while self.pending:
+            self.pending.popleft().result()
+        self.pool.shutdown()
+
+    def _write(self, index, frame):
+        image = np.flipud(frame)[..., 2::-1]
+        if self.image_format == "png16":
+            path = os.path.join(self.directory, f"{self.prefix}{index:06d}.png")
+            image = (np.clip(image, 0.0, 1.0) * 65535.0 + 0.5).astype('u2')
+            ok = cv2.imwrite(path, image, [cv2.IMWRITE_PNG_COMPRESSION, self.png_compression])
+        else:
+            path = os.path.join(self.directory, f"{self.prefix}{index:06d}.exr")
+            ok = cv2.imwrite(path, np.ascontiguousarray(image, dtype='f4'))
+        if not ok:
+            raise Exception(f"Could not write {path}")
+        self.frames_written += 1
@@ -1,23 +1,61 @@
+import os
 import sys
+import tempfile
+import threading
 import time
-import cv2
 from PySide6 import QtCore, QtWidgets, QtGui
+from chunked_export import ChunkedExporter, ExportCancelled
+from encoders import encoder_config
 from gl_widget import GLWidget
-from shaders import SHADERS
+from settings import load_settings
+from shaders import SHADERS, SHADER_GRAPHS
+from hashlife import SHADER_NAME as HASHLIFE
+import tracing
+
+# Larger simulation grids are only offered to shaders with bit-packed state
+MAX_UNPACKED_GRID = 4096
+
+
+class ExportWorker(QtCore.QThread):
+    progress = QtCore.Signal(int, int)
+    # Emitted with the output path and an error message; the message is empty on success
+    done = QtCore.Signal(str, str)
+
+    def __init__(self, exporter, parent=None):
+        super().__init__(parent)
+        self.exporter = exporter
+
+    def run(self):
+        try:
+            self.exporter.run(progress=self.progress.emit)
+            self.done.emit(self.exporter.path, "")
+        except ExportCancelled:
+            self.done.emit(self.exporter.path, "")
+        except Exception as e:
+            self.done.emit(self.exporter.path, str(e))
 
 
 class MainWindow(QtWidgets.QMainWindow):
+    # Emitted from the replay save thread with the output path and an error message, if any
+    replay_saved = QtCore.Signal(str, str)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Generative Art Studio")
         self.resize(1200, 800)
+        self.settings = load_settings()
+        # Recordings stream to a temporary file until they are saved
+        self.recording_path = None
+        self.export_worker = None
 
         central_widget = QtWidgets.QWidget()
         self.setCentralWidget(central_widget)
         layout = QtWidgets.QHBoxLayout(central_widget)
 
         # Left side: Preview
-        self.gl_widget = GLWidget()
+        self.gl_widget = GLWidget(settings=self.settings)
+        self.gl_widget.warmup_finished.connect(self.on_warmup_finished, QtCore.Qt.QueuedConnection)
+        self.gl_widget.hashlife_failed.connect(self.on_hashlife_failed, QtCore.Qt.QueuedConnection)
         layout.addWidget(self.gl_widget, stretch=3)
 
         # Right side: Controls
@@ -52,11 +90,96 @@ class MainWindow(QtWidgets.QMainWindow):
         # Shader Selection
         controls_layout.addWidget(QtWidgets.QLabel("Shader Type"))
         self.shader_combo = QtWidgets.QComboBox()
-        self.shader_combo.addItems(["Default", "Mandelbrot", "Julia", "Burning Ship", "Orbit Traps", "IFS Morphing", "Tree", "Stacking", "Voronoi", "Reaction Diffusion", "Slime Mold", "Cellular Automata 3D", "Flow Field", "Flow Field Simulation", "Curl Noise Flow", "Magnetic Fields", "Particles", "Game of Life", "Smooth Life", "Flame", "GPU Fire", "Smoke / Ink", "Droplet Ripples", "Noise", "Kaleidoscope", "Spiral", "Geometric", "Cosmic"])
+        self.shader_combo.addItems(["Default", "Mandelbrot", "Julia", "Burning Ship", "Orbit Traps", "IFS Morphing", "Tree", "Stacking", "Voronoi", "Reaction Diffusion", "Slime Mold", "Cellular Automata 3D", "Flow Field", "Flow Field Simulation", "Curl Noise Flow", "Magnetic Fields", "Particles", "Game of Life", "Bit Life", "Bit Life (Smooth)", "HashLife", "Smooth Life", "Flame", "GPU Fire", "Smoke / Ink", "Droplet Ripples", "Noise", "Kaleidoscope", "Spiral", "Geometric", "Cosmic"])
         self.shader_combo.currentIndexChanged.connect(self.change_shader)
         controls_layout.addWidget(self.shader_combo)
 
+        # Resolution
+        controls_layout.addWidget(QtWidgets.QLabel("Render Scale"))
+        self.render_scale_combo = QtWidgets.QComboBox()
+        self.render_scale_combo.addItems(["25%", "50%", "75%", "100%", "150%", "200%"])
+        label = f"{self.settings['render_scale'] * 100:g}%"
+        if self.render_scale_combo.findText(label) < 0:
+            self.render_scale_combo.addItem(label)
+        self.render_scale_combo.setCurrentText(label)
+        self.render_scale_combo.currentIndexChanged.connect(self.update_resolution_settings)
+        controls_layout.addWidget(self.render_scale_combo)
+
+        self.dynamic_resolution_cb = QtWidgets.QCheckBox("Dynamic Resolution")
+        self.dynamic_resolution_cb.setChecked(self.settings["dynamic_resolution"])
+        self.dynamic_resolution_cb.stateChanged.connect(self.toggle_dynamic_resolution)
+        controls_layout.addWidget(self.dynamic_resolution_cb)
+
+        controls_layout.addWidget(QtWidgets.QLabel("Simulation Grid"))
+        self.sim_size_combo = QtWidgets.QComboBox()
+        self.sim_size_combo.addItems(["Shader Default", "256", "512", "1024", "2048", "4096", "8192", "16384"])
+        sim_size = self.settings["sim_grid_size"]
+        if sim_size:
+            if self.sim_size_combo.findText(str(sim_size)) < 0:
+                self.sim_size_combo.addItem(str(sim_size))
+            self.sim_size_combo.setCurrentText(str(sim_size))
+        self.update_sim_sizes(self.shader_combo.currentText())
+        self.sim_size_combo.currentIndexChanged.connect(self.update_resolution_settings)
+        controls_layout.addWidget(self.sim_size_combo)
+
+        controls_layout.addWidget(QtWidgets.QLabel("Simulation Steps / Frame"))
+        self.sim_steps_spin = QtWidgets.QSpinBox()
+        self.sim_steps_spin.setRange(0, 64)
+        self.sim_steps_spin.setSpecialValueText("Shader Default")
+        self.sim_steps_spin.setValue(self.settings["sim_steps"] or 0)
+        self.sim_steps_spin.valueChanged.connect(self.update_resolution_settings)
+        controls_layout.addWidget(self.sim_steps_spin)
+
+        self.sparse_tiles_cb = QtWidgets.QCheckBox("Sparse Tiles")
+        self.sparse_tiles_cb.setChecked(self.settings["sparse_tiles"])
+        self.sparse_tiles_cb.stateChanged.connect(self.update_resolution_settings)
+        controls_layout.addWidget(self.sparse_tiles_cb)
+
+        controls_layout.addWidget(QtWidgets.QLabel("Smooth Life Radii (ri / ra)"))
+        self.kernel_ri_spin = QtWidgets.QDoubleSpinBox()
+        self.kernel_ri_spin.setRange(0.5, 128.0)
+        self.kernel_ri_spin.setSingleStep(0.5)
+        self.kernel_ri_spin.setValue(self.settings["kernel_ri"])
+        self.kernel_ri_spin.valueChanged.connect(self.update_kernel_radii)
+        controls_layout.addWidget(self.kernel_ri_spin)
+        self.kernel_ra_spin = QtWidgets.QDoubleSpinBox()
+        self.kernel_ra_spin.setRange(1.0, 384.0)
+        self.kernel_ra_spin.setSingleStep(0.5)
+        self.kernel_ra_spin.setValue(self.settings["kernel_ra"])
+        self.kernel_ra_spin.valueChanged.connect(self.update_kernel_radii)
+        controls_layout.addWidget(self.kernel_ra_spin)
+
+        controls_layout.addWidget(QtWidgets.QLabel("HashLife Generations / Frame (2^N)"))
+        self.hashlife_step_spin = QtWidgets.QSpinBox()
+        self.hashlife_step_spin.setRange(0, 40)
+        self.hashlife_step_spin.setValue(self.settings["hashlife_step_exponent"])
+        self.hashlife_step_spin.valueChanged.connect(self.gl_widget.set_hashlife_step_exponent)
+        controls_layout.addWidget(self.hashlife_step_spin)
+
+        self.hashlife_pattern_btn = QtWidgets.QPushButton("Load HashLife Pattern...")
+        self.hashlife_pattern_btn.clicked.connect(self.load_hashlife_pattern)
+        controls_layout.addWidget(self.hashlife_pattern_btn)
+
         # Recording
+        controls_layout.addWidget(QtWidgets.QLabel("Record Size"))
+        self.record_size_combo = QtWidgets.QComboBox()
+        self.record_size_combo.addItems(["Window", "1280x720", "1920x1080", "2560x1440", "3840x2160"])
+        record_size = self.settings["record_size"]
+        if record_size:
+            label = f"{record_size[0]}x{record_size[1]}"
+            if self.record_size_combo.findText(label) < 0:
+                self.record_size_combo.addItem(label)
+            self.record_size_combo.setCurrentText(label)
+        self.record_size_combo.currentIndexChanged.connect(self.update_record_settings)
+        controls_layout.addWidget(self.record_size_combo)
+
+        controls_layout.addWidget(QtWidgets.QLabel("Record FPS"))
+        self.record_fps_spin = QtWidgets.QSpinBox()
+        self.record_fps_spin.setRange(1, 240)
+        self.record_fps_spin.setValue(self.settings["record_fps"])
+        self.record_fps_spin.valueChanged.connect(self.update_record_settings)
+        controls_layout.addWidget(self.record_fps_spin)
+
         self.record_btn = QtWidgets.QPushButton("Start Recording")
         self.record_btn.clicked.connect(self.toggle_recording)
         controls_layout.addWidget(self.record_btn)
@@ -66,6 +189,31 @@ class MainWindow(QtWidgets.QMainWindow):
         self.save_btn.setEnabled(False)
         controls_layout.addWidget(self.save_btn)
 
+        self.timeline_btn = QtWidgets.QPushButton("Record Inputs")
+        self.timeline_btn.clicked.connect(self.toggle_timeline)
+        controls_layout.addWidget(self.timeline_btn)
+
+        # Instant Replay
+        self.replay_cb = QtWidgets.QCheckBox("Instant Replay")
+        self.replay_cb.setChecked(self.settings["replay_enabled"])
+        self.replay_cb.stateChanged.connect(self.toggle_replay)
+        controls_layout.addWidget(self.replay_cb)
+
+        self.replay_btn = QtWidgets.QPushButton("Save Replay (F8)")
+        self.replay_btn.clicked.connect(self.save_replay)
+        self.replay_btn.setEnabled(self.settings["replay_enabled"])
+        controls_layout.addWidget(self.replay_btn)
+        QtGui.QShortcut(QtGui.QKeySequence("F8"), self, activated=self.save_replay)
+        self.replay_saved.connect(self.on_replay_saved)
+
+        # Performance HUD
+        self.hud_cb = QtWidgets.QCheckBox("Performance HUD (F3)")
+        self.hud_cb.setChecked(self.settings["hud"])
+        self.hud_cb.stateChanged.connect(self.toggle_hud)
+        controls_layout.addWidget(self.hud_cb)
+        QtGui.QShortcut(QtGui.QKeySequence("F3"), self, activated=self.hud_cb.toggle)
+        QtGui.QShortcut(QtGui.QKeySequence("F9"), self, activated=self.toggle_trace)
+
         # Auto Animate
         self.animate_cb = QtWidgets.QCheckBox("Auto Animate")
         self.animate_cb.stateChanged.connect(self.toggle_animation)
@@ -73,6 +221,15 @@ class MainWindow(QtWidgets.QMainWindow):
 
         controls_layout.addStretch()
 
+    def on_warmup_finished(self, failures):
+        if failures:
+            details = "\n\n".join(f"{name}:\n{msg}" for name, msg in failures)
+            QtWidgets.QMessageBox.critical(self, "Shader Error", f"{len(failures)} shader(s) failed to compile:\n\n{details}")
+
+    def on_hashlife_failed(self, msg):
+        # The preview keeps showing the last generation
+        self.statusBar().showMessage(f"HashLife stopped: {msg}")
+
     def toggle_animation(self, state):
         # state is 0 for Unchecked, 2 for Checked
         self.gl_widget.auto_animate = (state != 0)
@@ -82,50 +239,226 @@ class MainWindow(QtWidgets.QMainWindow):
         self.gl_widget.offset_x = self.offset_x_slider.value() / 50.0
         self.gl_widget.offset_y = self.offset_y_slider.value() / 50.0
 
+    def update_record_settings(self):
+        size = self.record_size_combo.currentText()
+        self.gl_widget.record_size = None if size == "Window" else tuple(int(v) for v in size.split("x"))
+        self.gl_widget.record_fps = self.record_fps_spin.value()
+
+    def update_resolution_settings(self):
+        self.gl_widget.render_scale = float(self.render_scale_combo.currentText().rstrip("%")) / 100.0
+        size = self.sim_size_combo.currentText()
+        # A new grid size restarts the simulation from its init step
+        self.gl_widget.sim_size = None if size == "Shader Default" else (int(size), int(size))
+        self.gl_widget.sim_steps = self.sim_steps_spin.value() or None
+        self.gl_widget.sparse_tiles = self.sparse_tiles_cb.isChecked()
+
+    def update_kernel_radii(self):
+        # The annulus must stay outside the inner disk
+        ri = self.kernel_ri_spin.value()
+        ra = max(self.kernel_ra_spin.value(), ri + 0.5)
+        self.gl_widget.kernel_radii = (ri, ra)
+
+    def toggle_hud(self, state):
+        self.gl_widget.hud_visible = (state != 0)
+
+    def toggle_trace(self):
+        # F9 starts a Chrome trace; pressing it again writes the file
+        if tracing.enabled():
+            tracing.stop()
+        else:
+            tracing.start(os.path.abspath(time.strftime("trace_%Y%m%d_%H%M%S.json")))
+
+    def toggle_dynamic_resolution(self, state):
+        self.gl_widget.set_dynamic_resolution(state != 0)
+
+    def update_sim_sizes(self, shader_type):
+        # A 16384 grid is 32 MB bit-packed but gigabytes as float state
+        resources = SHADER_GRAPHS.get(shader_type, {}).get("resources", {}).values()
+        packed = any(options.get("pack", 1) > 1 for options in resources)
+        model = self.sim_size_combo.model()
+        for index in range(self.sim_size_combo.count()):
+            text = self.sim_size_combo.itemText(index)
+            if text.isdigit() and int(text) > MAX_UNPACKED_GRID:
+                model.item(index).setEnabled(packed)
+        current = self.sim_size_combo.currentText()
+        if not packed and current.isdigit() and int(current) > MAX_UNPACKED_GRID:
+            self.sim_size_combo.setCurrentText("Shader Default")
+            self.gl_widget.sim_size = None
+
     def change_shader(self):
         shader_type = self.shader_combo.currentText()
+        self.update_sim_sizes(shader_type)
         self.gl_widget.current_shader_name = shader_type
-        if shader_type in ["Game of Life", "Smooth Life", "Flame", "Reaction Diffusion", "Slime Mold", "Cellular Automata 3D", "GPU Fire", "Smoke / Ink", "Droplet Ripples", "Flow Field Simulation"]:
-            self.gl_widget.start_time = time.time()
+        if shader_type == HASHLIFE and self.gl_widget.renderer:
+            self.start_hashlife()
+            return
+        self.gl_widget.stop_hashlife()
         if shader_type in SHADERS and self.gl_widget.renderer:
-            success, msg = self.gl_widget.renderer.update_shader(SHADERS[shader_type])
+            self.gl_widget.makeCurrent()
+            try:
+                success, msg = self.gl_widget.renderer.load_shader(shader_type)
+            finally:
+                self.gl_widget.doneCurrent()
             if not success:
                 QtWidgets.QMessageBox.critical(self, "Shader Error", msg)
+            else:
+                stats = self.gl_widget.renderer.program_cache.stats()
+                print(f"{shader_type}: {msg} [cache {stats['hits']} hits / {stats['misses']} misses]")
+
+    def start_hashlife(self):
+        try:
+            self.gl_widget.start_hashlife()
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(self, "HashLife Error", str(e))
+
+    def load_hashlife_pattern(self):
+        path, _ = QtWidgets.QFileDialog.getOpenFileName(self, "Load Life Pattern", "", "RLE Patterns (*.rle);;All Files (*)")
+        if not path:
+            return
+        self.gl_widget.hashlife_pattern = path
+        if self.shader_combo.currentText() == HASHLIFE:
+            self.start_hashlife()
+        else:
+            self.shader_combo.setCurrentText(HASHLIFE)
 
     def toggle_recording(self):
         if not self.gl_widget.is_recording:
-            self.gl_widget.is_recording = True
-            self.gl_widget.frames = []
+            self.discard_recording()
+            fd, self.recording_path = tempfile.mkstemp(prefix="recording_", suffix=".avi")
+            os.close(fd)
+            self.gl_widget.start_recording(self.recording_path)
+            self.record_size_combo.setEnabled(False)
+            self.record_fps_spin.setEnabled(False)
             self.record_btn.setText("Stop Recording")
             self.save_btn.setEnabled(False)
             print("Recording started...")
         else:
-            self.gl_widget.is_recording = False
             self.record_btn.setText("Start Recording")
-            self.save_btn.setEnabled(True)
-            print(f"Recording stopped. Captured {len(self.gl_widget.frames)} frames.")
+            self.record_size_combo.setEnabled(True)
+            self.record_fps_spin.setEnabled(True)
+            try:
+                encoder = self.gl_widget.stop_recording()
+            except Exception as e:
+                print(f"Error finishing recording: {e}")
+                QtWidgets.QMessageBox.critical(self, "Recording Error", f"Failed to record video: {str(e)}")
+                self.discard_recording()
+                return
+            self.save_btn.setEnabled(encoder.frames_written > 0)
+            print(f"Recording stopped. Captured {encoder.frames_written} frames, dropped {encoder.frames_dropped}.")
 
-    def save_video(self):
-        print(f"Attempting to save video with {len(self.gl_widget.frames)} frames")
-        if not self.gl_widget.frames:
-            QtWidgets.QMessageBox.warning(self, "No Frames", "No frames captured to save.")
+    def toggle_timeline(self):
+        # Logs inputs instead of pixels; render_cli.py --timeline re-renders the session
+        if self.gl_widget.timeline is None:
+            self.gl_widget.start_timeline()
+            self.timeline_btn.setText("Stop Recording Inputs")
+            print("Input recording started...")
             return
 
+        timeline = self.gl_widget.stop_timeline()
+        self.timeline_btn.setText("Record Inputs")
+        print(f"Input recording stopped. {len(timeline.events)} events over {timeline.duration:.1f}s.")
         try:
-            path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Save Video", "output.mp4", "Video Files (*.mp4)")
-            print(f"Selected path: {path}")
+            path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Save Input Timeline", "session.json", "Timeline Files (*.json)")
             if path:
-                height, width, _ = self.gl_widget.frames[0].shape
-                fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-                out = cv2.VideoWriter(path, fourcc, 60.0, (width, height))
-                if not out.isOpened():
-                    raise Exception("Could not open VideoWriter. Check if the path is writable.")
-
-                for frame in self.gl_widget.frames:
-                    out.write(frame)
-                out.release()
-                QtWidgets.QMessageBox.information(self, "Success", f"Video saved to {path}")
-                print(f"Video saved successfully to {path}")
+                timeline.save(path)
+                print(f"Timeline saved to {path}")
+        except Exception as e:
+            print(f"Error saving timeline: {e}")
+            QtWidgets.QMessageBox.critical(self, "Save Error", f"Failed to save timeline: {str(e)}")
+
+    def toggle_replay(self, state):
+        enabled = (state != 0)
+        self.gl_widget.set_replay_enabled(enabled)
+        self.replay_btn.setEnabled(enabled)
+
+    def save_replay(self):
+        replay = self.gl_widget.replay
+        if replay is None or replay.count == 0:
+            print("Replay buffer is empty, nothing to save")
+            return
+        if replay.saving:
+            print("A replay is already being saved")
+            return
+
+        path = os.path.abspath(time.strftime("replay_%Y%m%d_%H%M%S.mp4"))
+        print(f"Saving last {replay.duration:.1f}s of replay to {path}...")
+        threading.Thread(target=self._save_replay_worker, args=(replay, path), name="ReplaySave", daemon=True).start()
+
+    def _save_replay_worker(self, replay, path):
+        backend, options = encoder_config(self.settings)
+        try:
+            replay.save(path, pixel_format="i420", backend=backend, **options)
+            self.replay_saved.emit(path, "")
         except Exception as e:
-            print(f"Error saving video: {e}")
-            QtWidgets.QMessageBox.critical(self, "Save Error", f"Failed to save video: {str(e)}")
\ No newline at end of file
+            self.replay_saved.emit(path, str(e))
+
+    def on_replay_saved(self, path, error):
+        if error:
+            print(f"Error saving replay: {error}")
+            QtWidgets.QMessageBox.critical(self, "Replay Error", f"Failed to save replay: {error}")
+        else:
+            print(f"Replay saved to {path}")
+
+    def discard_recording(self):
+        if self.recording_path and os.path.exists(self.recording_path):
+            os.remove(self.recording_path)
+        self.recording_path = None
+
+    def save_video(self):
+        print(f"Attempting to save recording {self.recording_path}")
+        if not self.recording_path or not os.path.exists(self.recording_path):
+            QtWidgets.QMessageBox.warning(self, "No Frames", "No frames captured to save.")
+            return
+
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Save Video", "output.mp4", "Video Files (*.mp4 *.mov)")
+        print(f"Selected path: {path}")
+        if not path:
+            return
+
+        # Encode in parallel chunks on a background thread so the app stays responsive
+        backend, options = encoder_config(self.settings)
+        exporter = ChunkedExporter(self.recording_path, path, backend=backend, options=options)
+        self.export_dialog = QtWidgets.QProgressDialog("Exporting video...", "Cancel", 0, 100, self)
+        self.export_dialog.setWindowModality(QtCore.Qt.WindowModal)
+        self.export_dialog.canceled.connect(exporter.cancel)
+        self.export_dialog.show()
+
+        self.export_worker = ExportWorker(exporter, self)
+        self.export_worker.progress.connect(self.on_export_progress)
+        self.export_worker.done.connect(self.on_export_done)
+        self.record_btn.setEnabled(False)
+        self.save_btn.setEnabled(False)
+        self.export_worker.start()
+
+    def on_export_progress(self, done, total):
+        self.export_dialog.setMaximum(max(total, 1))
+        self.export_dialog.setValue(min(done, total))
+
+    def on_export_done(self, path, error):
+        worker, self.export_worker = self.export_worker, None
+        worker.wait()
+        self.export_dialog.reset()
+        self.record_btn.setEnabled(True)
+        self.save_btn.setEnabled(True)
+        if worker.exporter.cancelled:
+            print("Export cancelled.")
+        elif error:
+            print(f"Error saving video: {error}")
+            QtWidgets.QMessageBox.critical(self, "Save Error", f"Failed to save video: {error}")
+        else:
+            QtWidgets.QMessageBox.information(self, "Success", f"Video saved to {path}")
+            print(f"Video saved successfully to {path}")
+
+    def closeEvent(self, event):
+        if self.export_worker:
+            self.export_worker.exporter.cancel()
+            self.export_worker.wait()
+        if self.gl_widget.is_recording:
+            try:
+                self.gl_widget.stop_recording()
+            except Exception as e:
+                print(f"Error finishing recording: {e}")
+        self.discard_recording()
+        self.gl_widget.stop_hashlife()
+        tracing.stop()
+        super().closeEvent(event)
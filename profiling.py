@@ -0,0 +1,130 @@
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+import numpy as np
+
+PERCENTILES = (50, 95, 99)
+
+
+class GPUTimer:
+    # Ring of timer queries. A query is only read back `depth` measurements after it was
+    # issued, when the GPU has long finished it, so timing never stalls the pipeline.
+    def __init__(self, ctx, depth=3):
+        try:
+            self.queries = [ctx.query(time=True) for _ in range(depth)]
+        except Exception as e:
+            print(f"GPU timer queries unavailable: {e}")
+            self.queries = []
+        self.next_index = 0
+        self.issued = 0
+        self.completed = 0
+        # Milliseconds of the latest finished measurement, or None before the first one
+        self.last_ms = None
+
+    @property
+    def available(self):
+        return bool(self.queries)
+
+    @contextmanager
+    def measure(self):
+        if not self.queries:
+            yield
+            return
+        query = self.queries[self.next_index]
+        if self.issued >= len(self.queries):
+            self.last_ms = query.elapsed / 1e6
+            self.completed += 1
+        with query:
+            yield
+        self.next_index = (self.next_index + 1) % len(self.queries)
+        self.issued += 1
+
+    def reset(self):
+        self.next_index = 0
+        self.issued = 0
+        self.last_ms = None
+
+
+class Profiler:
+    # Named GPU timings (one query ring per name) and CPU spans, each kept over a rolling
+    # window of samples. GPU timer queries cannot nest, so GPU scopes must not overlap;
+    # CPU spans can. Names are grouped by prefix, e.g. "render/simulate".
+    def __init__(self, ctx, window=300, depth=3):
+        self.ctx = ctx
+        self.window = window
+        self.depth = depth
+        self.gpu_timers = {}
+        self.samples = {}
+        # Frame in which each GPU timer last ran, so stale passes drop out of totals
+        self.last_used = {}
+        self.frame = 0
+
+    @property
+    def gpu_available(self):
+        return any(timer.available for timer in self.gpu_timers.values())
+
+    def next_frame(self):
+        self.frame += 1
+
+    def gpu(self, name):
+        timer = self.gpu_timers.get(name)
+        if timer is None:
+            timer = self.gpu_timers[name] = GPUTimer(self.ctx, self.depth)
+        if not timer.available:
+            return nullcontext()
+        self.last_used[name] = self.frame
+        return self._gpu_scope(name, timer)
+
+    @contextmanager
+    def _gpu_scope(self, name, timer):
+        completed = timer.completed
+        with timer.measure():
+            yield
+        if timer.completed != completed:
+            self.record(name, timer.last_ms)
+
+    @contextmanager
+    def cpu(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000.0)
+
+    def record(self, name, ms):
+        series = self.samples.get(name)
+        if series is None:
+            series = self.samples[name] = deque(maxlen=self.window)
+        series.append(ms)
+
+    def gpu_total(self, prefix=""):
+        # Sum of the latest GPU timings under a prefix that ran this frame, or None
+        values = [
+            timer.last_ms for name, timer in self.gpu_timers.items()
+            if name.startswith(prefix) and self.last_used.get(name) == self.frame and timer.last_ms is not None
+        ]
+        return sum(values) if values else None
+
+    def stats(self, name=None):
+        # {name: {"count", "mean", "p50", "p95", "p99", "max"}} in milliseconds
+        names = [name] if name else sorted(self.samples)
+        result = {}
+        for key in names:
+            values = np.fromiter(self.samples.get(key, ()), dtype='f8')
+            if not len(values):
+                continue
+            entry = {"count": len(values), "mean": float(values.mean()), "max": float(values.max())}
+            for p, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+                entry[f"p{p}"] = float(value)
+            result[key] = entry
+        return result
+
+    def report(self):
+        lines = [f"{'name':<28} {'mean':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  (ms)"]
+        for name, entry in self.stats().items():
+            lines.append(f"{name:<28} {entry['mean']:8.2f} {entry['p50']:8.2f} {entry['p95']:8.2f} {entry['p99']:8.2f} {entry['max']:8.2f}")
+        return "\n".join(lines)
+
+    def reset(self):
+        self.samples = {}
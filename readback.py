@@ -0,0 +1,63 @@
+from collections import deque
+
+import numpy as np
+
+import tracing
+
+# ModernGL read dtypes and the numpy arrays they fill
+READ_DTYPES = {"f1": "u1", "f2": "f2", "f4": "f4"}
+
+
+class PBORing:
+    # Asynchronous framebuffer readback through a ring of pixel-buffer objects.
+    # Each read goes into a PBO that is only mapped once `depth` newer reads are
+    # queued behind it, so the transfer has finished by the time the CPU needs it.
+    def __init__(self, ctx, size, components=3, depth=3, dtype="f1"):
+        if depth < 1:
+            raise ValueError("Readback ring depth must be at least 1")
+
+        self.size = tuple(size)
+        self.components = components
+        self.depth = depth
+        self.dtype = dtype
+        self.array_dtype = np.dtype(READ_DTYPES[dtype])
+        width, height = self.size
+        self.shape = (height, width, components) if components > 1 else (height, width)
+        self.nbytes = width * height * components * self.array_dtype.itemsize
+
+        self.buffers = [ctx.buffer(reserve=self.nbytes) for _ in range(depth)]
+        self.in_flight = deque()
+        self.next_index = 0
+
+    def push(self, fbo):
+        # Returns the oldest finished frame once the ring is full, otherwise None
+        frame = None
+        if len(self.in_flight) == self.depth:
+            frame = self._collect()
+
+        buf = self.buffers[self.next_index]
+        with tracing.span("fbo.read", "readback"):
+            fbo.read_into(buf, components=self.components, alignment=1, dtype=self.dtype)
+        self.in_flight.append(buf)
+        self.next_index = (self.next_index + 1) % self.depth
+        return frame
+
+    def drain(self):
+        frames = []
+        while self.in_flight:
+            frames.append(self._collect())
+        return frames
+
+    def release(self):
+        self.in_flight.clear()
+        for buf in self.buffers:
+            buf.release()
+        self.buffers = []
+
+    def _collect(self):
+        # Map the PBO straight into a fresh array that is handed to the consumer as-is
+        buf = self.in_flight.popleft()
+        frame = np.empty(self.shape, dtype=self.array_dtype)
+        with tracing.span("pbo.map", "readback"):
+            buf.read_into(frame)
+        return frame
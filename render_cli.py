@@ -0,0 +1,240 @@
+import argparse
+import sys
+import time
+
+import moderngl
+import numpy as np
+
+from encoders import create_encoder, encoder_config, BACKENDS, FFmpegBackend
+from hashlife import SHADER_NAME as HASHLIFE
+from image_sequence import ImageSequenceWriter, IMAGE_FORMATS
+from readback import PBORing
+from renderer import Renderer, animate_params
+from settings import load_settings
+from shaders import SHADERS
+from timeline import InputTimeline
+import tracing
+
+
+def create_standalone_context():
+    # Prefer EGL so render boxes without an X server work; fall back to the platform default
+    try:
+        return moderngl.create_standalone_context(require=330, backend='egl')
+    except Exception as e:
+        print(f"EGL context unavailable ({e}), falling back to default backend")
+        return moderngl.create_standalone_context(require=330)
+
+
+class OfflineRenderer:
+    def __init__(self, shader_name, width, height, fps, ctx=None, supersample=1, dtype='f1', sim_size=None, sim_steps=None, kernel_radii=None):
+        self.ctx = ctx or create_standalone_context()
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.supersample = supersample
+        self.frame_index = 0
+
+        print(f"Renderer: {self.ctx.info['GL_RENDERER']}")
+
+        self.renderer = Renderer(self.ctx)
+        # Supersampled frames render at a multiple of the output size and are filtered down;
+        # factors below 1 render smaller and are upscaled
+        self.renderer.render_scale = supersample
+        self.renderer.sim_size = (sim_size, sim_size) if sim_size else None
+        # Simulation time advances by one output frame per displayed frame, however slow the encode
+        self.renderer.sim_steps = sim_steps
+        self.renderer.sim_dt = 1.0 / fps
+        self.renderer.kernel_radii = kernel_radii
+        self.set_shader(shader_name)
+
+        # Float targets ('f2'/'f4') keep the shader output unquantized for image sequences
+        self.texture = self.ctx.texture((width, height), 4, dtype=dtype)
+        self.fbo = self.ctx.framebuffer(color_attachments=[self.texture])
+
+    def set_shader(self, shader_name):
+        if shader_name == HASHLIFE:
+            raise ValueError(f"'{HASHLIFE}' runs on the CPU in the live view only and cannot be rendered offline")
+        if shader_name not in SHADERS:
+            raise ValueError(f"Unknown shader '{shader_name}'")
+        success, msg = self.renderer.load_shader(shader_name)
+        if not success:
+            raise RuntimeError(f"Shader error in '{shader_name}': {msg}")
+        self.shader_name = shader_name
+
+    def render_frame(self, zoom=1.0, offset=(0.0, 0.0), auto_animate=False, t=None):
+        # Deterministic clock: unless given, the shader sees frame_index / fps regardless of wall time
+        if t is None:
+            t = self.frame_index / self.fps
+        if auto_animate:
+            zoom, offset = animate_params(zoom, offset, t)
+
+        with tracing.span("render_frame", "frame", frame=self.frame_index):
+            self.renderer.render(t, (self.width, self.height), zoom=zoom, offset=offset, fbo=self.fbo)
+        self.frame_index += 1
+        return t
+
+    def capture(self):
+        # Flipped BGR copy of the last frame, ready to be read straight into the encoder
+        return self.renderer.capture(self.texture, "bgr")
+
+    def read_frame(self):
+        data = self.capture().read(components=3, alignment=1)
+        return np.frombuffer(data, dtype='u1').reshape(self.height, self.width, 3)
+
+
+def encode_frames(offline, path, total_frames, render_step, readback_depth=3, backend="opencv", options=None):
+    # Calls render_step(i) for every frame and streams the results into the encoder
+    readback = PBORing(offline.ctx, (offline.width, offline.height), components=3, depth=readback_depth)
+    out = create_encoder(path, float(offline.fps), (offline.width, offline.height), "bgr", backend, **(options or {}))
+
+    start = time.perf_counter()
+    try:
+        for i in range(total_frames):
+            render_step(i)
+            frame = readback.push(offline.capture())
+            if frame is not None:
+                with tracing.span("encoder.write", "encode", backend=backend):
+                    out.write(frame)
+            if (i + 1) % offline.fps == 0 or i + 1 == total_frames:
+                elapsed = time.perf_counter() - start
+                print(f"Rendered {i + 1}/{total_frames} frames ({(i + 1) / elapsed:.1f} fps)")
+        for frame in readback.drain():
+            out.write(frame)
+    finally:
+        out.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Done in {elapsed:.1f}s")
+
+
+def render_video(shader_name, path, width, height, fps, duration, zoom=1.0, offset=(0.0, 0.0), auto_animate=False, readback_depth=3, supersample=1, backend="opencv", options=None, sim_size=None, sim_steps=None, kernel_radii=None):
+    offline = OfflineRenderer(shader_name, width, height, fps, supersample=supersample, sim_size=sim_size, sim_steps=sim_steps, kernel_radii=kernel_radii)
+    total_frames = int(round(duration * fps))
+
+    print(f"Rendering '{shader_name}' at {width}x{height}, {fps} fps, {total_frames} frames -> {path}")
+    encode_frames(offline, path, total_frames,
+                  lambda i: offline.render_frame(zoom=zoom, offset=offset, auto_animate=auto_animate),
+                  readback_depth=readback_depth, backend=backend, options=options)
+
+
+def render_timeline(timeline_path, path, width, height, fps, readback_depth=3, supersample=1, backend="opencv", options=None, sim_size=None, sim_steps=None, kernel_radii=None):
+    # Re-render a session logged with "Record Inputs" at any size and frame rate
+    timeline = InputTimeline.load(timeline_path)
+    # Reject up front rather than failing partway through the encode
+    hashlife_times = [event["t"] for event in timeline.events if event["shader"] == HASHLIFE]
+    if hashlife_times:
+        raise ValueError(f"Timeline shows '{HASHLIFE}' from {hashlife_times[0]:.1f}s, which cannot be rendered offline; "
+                         f"trim it or record the session as video instead")
+    first = timeline.state_at(0.0)
+    offline = OfflineRenderer(first["shader"], width, height, fps, supersample=supersample, sim_size=sim_size, sim_steps=sim_steps, kernel_radii=kernel_radii)
+    total_frames = int(round(timeline.duration * fps))
+
+    def render_step(i):
+        state = timeline.state_at(i / fps)
+        if state["shader"] != offline.shader_name:
+            offline.set_shader(state["shader"])
+        offline.render_frame(
+            zoom=state["zoom"], offset=(state["offset_x"], state["offset_y"]),
+            auto_animate=state["auto_animate"], t=state["clock"]
+        )
+
+    print(f"Rendering timeline {timeline_path} ({len(timeline.events)} events) at {width}x{height}, "
+          f"{fps} fps, {supersample}x supersampling, {total_frames} frames -> {path}")
+    encode_frames(offline, path, total_frames, render_step, readback_depth=readback_depth, backend=backend, options=options)
+
+
+def render_image_sequence(shader_name, directory, width, height, fps, duration, image_format="png16", zoom=1.0, offset=(0.0, 0.0), auto_animate=False, readback_depth=3, supersample=1, workers=None, sim_size=None, sim_steps=None, kernel_radii=None):
+    # Renders into a float target and writes 16-bit PNG or float EXR frames from a thread pool
+    offline = OfflineRenderer(shader_name, width, height, fps, supersample=supersample, dtype='f4', sim_size=sim_size, sim_steps=sim_steps, kernel_radii=kernel_radii)
+    readback = PBORing(offline.ctx, (width, height), components=3, depth=readback_depth, dtype='f4')
+    writer = ImageSequenceWriter(directory, image_format, workers=workers)
+    total_frames = int(round(duration * fps))
+
+    print(f"Rendering '{shader_name}' at {width}x{height}, {total_frames} {image_format} frames -> {directory}")
+    collected = 0
+    try:
+        for i in range(total_frames):
+            offline.render_frame(zoom=zoom, offset=offset, auto_animate=auto_animate)
+            frame = readback.push(offline.fbo)
+            if frame is not None:
+                writer.write(collected, frame)
+                collected += 1
+            if (i + 1) % fps == 0 or i + 1 == total_frames:
+                print(f"Rendered {i + 1}/{total_frames} frames, written {writer.frames_written} ({writer.fps:.1f} fps)")
+        for frame in readback.drain():
+            writer.write(collected, frame)
+            collected += 1
+    finally:
+        writer.close()
+
+    print(f"Wrote {writer.frames_written} frames at {writer.fps:.1f} fps")
+
+
+def main(argv=None):
+    settings = load_settings()
+    parser = argparse.ArgumentParser(description="Render a shader to video without a display.")
+    parser.add_argument("--shader", default="Default", help="Shader name (see --list)")
+    parser.add_argument("--list", action="store_true", help="List available shaders and exit")
+    parser.add_argument("-o", "--output", default="output.mp4", help="Output video path")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--fps", type=int, default=60)
+    parser.add_argument("--duration", type=float, default=10.0, help="Clip length in seconds")
+    parser.add_argument("--zoom", type=float, default=1.0)
+    parser.add_argument("--offset-x", type=float, default=0.0)
+    parser.add_argument("--offset-y", type=float, default=0.0)
+    parser.add_argument("--animate", action="store_true", help="Enable auto-animation")
+    parser.add_argument("--timeline", help="Re-render an input timeline saved with 'Record Inputs'")
+    parser.add_argument("--image-sequence", metavar="DIR", help="Write an image sequence to DIR instead of a video")
+    parser.add_argument("--image-format", choices=IMAGE_FORMATS, default="png16", help="16-bit PNG or float EXR")
+    parser.add_argument("--workers", type=int, help="Threads compressing and writing image files")
+    parser.add_argument("--supersample", type=float, default=1.0,
+                        help="Render at N times the output size and filter down; below 1, render smaller and upscale")
+    parser.add_argument("--sim-size", type=int, help="Simulation grid size of feedback shaders (default: the shader's own)")
+    parser.add_argument("--sim-steps", type=int, help="Simulation steps per output frame (default: the shader's own)")
+    parser.add_argument("--kernel-radii", nargs=2, type=float, metavar=("RI", "RA"),
+                        help="Inner and outer kernel radii of Smooth Life (default: 3 9)")
+    parser.add_argument("--encoder", choices=list(BACKENDS), default=settings["encoder_backend"], help="Encoder backend")
+    parser.add_argument("--codec", choices=list(FFmpegBackend.CODECS), default=settings["encoder_codec"], help="ffmpeg codec")
+    parser.add_argument("--crf", type=int, default=settings["encoder_crf"], help="ffmpeg constant rate factor")
+    parser.add_argument("--preset", default=settings["encoder_preset"], help="ffmpeg speed preset")
+    parser.add_argument("--trace", metavar="PATH", help="Write a Chrome trace-event JSON file (opens in Perfetto)")
+    parser.add_argument("--readback-depth", type=int, default=settings["readback_ring_depth"],
+                        help="Number of pixel-buffer objects used for asynchronous readback")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name in SHADERS:
+            print(name)
+        return 0
+
+    settings.update(encoder_backend=args.encoder, encoder_codec=args.codec, encoder_crf=args.crf, encoder_preset=args.preset)
+    backend, options = encoder_config(settings)
+
+    if args.trace:
+        tracing.start(args.trace)
+    try:
+        if args.image_sequence:
+            render_image_sequence(args.shader, args.image_sequence, args.width, args.height, args.fps, args.duration,
+                                  image_format=args.image_format, zoom=args.zoom, offset=(args.offset_x, args.offset_y),
+                                  auto_animate=args.animate, readback_depth=args.readback_depth,
+                                  supersample=args.supersample, workers=args.workers, sim_size=args.sim_size, sim_steps=args.sim_steps, kernel_radii=args.kernel_radii)
+        elif args.timeline:
+            render_timeline(args.timeline, args.output, args.width, args.height, args.fps,
+                            readback_depth=args.readback_depth, supersample=args.supersample,
+                            backend=backend, options=options, sim_size=args.sim_size, sim_steps=args.sim_steps, kernel_radii=args.kernel_radii)
+        else:
+            render_video(args.shader, args.output, args.width, args.height, args.fps, args.duration,
+                         zoom=args.zoom, offset=(args.offset_x, args.offset_y), auto_animate=args.animate,
+                         readback_depth=args.readback_depth, supersample=args.supersample,
+                         backend=backend, options=options, sim_size=args.sim_size, sim_steps=args.sim_steps, kernel_radii=args.kernel_radii)
+    except Exception as e:
+        print(f"Render failed: {e}")
+        return 1
+    finally:
+        tracing.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
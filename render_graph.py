@@ -0,0 +1,524 @@
+from contextlib import nullcontext
+
+import moderngl
+import numpy as np
+
+import tracing
+from fft_convolution import DiskConvolution
+from shaders import SHADERS, PASS_SHADERS, SHADER_GRAPHS
+
+# Output name for the framebuffer passed to Renderer.render()
+SCREEN = "screen"
+
+# Changes of a state channel up to this much leave a tile inactive
+ACTIVITY_THRESHOLD = 1.0 / 512.0
+# Largest state texture pair a graph may allocate, in bytes
+MAX_STATE_BYTES = 1 << 30
+# How often, in frames, the share of dispatched tiles is read back
+TILE_REPORT_FRAMES = 30
+
+# Vertex shader of sparse passes: one instanced quad per tile, collapsed unless the tile or
+# one of its neighbours changed in the previous frame (or every tile is due, `full`)
+TILE_VERTEX_SHADER = """
+    #version 330
+    uniform sampler2D activity;
+    uniform int tile;
+    uniform int full;
+    uniform vec2 resolution;
+    in vec2 in_vert;
+    out vec2 v_texcoord;
+    void main() {
+        ivec2 tiles = textureSize(activity, 0);
+        ivec2 t = ivec2(gl_InstanceID % tiles.x, gl_InstanceID / tiles.x);
+        bool is_active = full != 0;
+        for (int y = -1; y <= 1; y++) {
+            for (int x = -1; x <= 1; x++) {
+                is_active = is_active || texelFetch(activity, (t + ivec2(x, y) + tiles) % tiles, 0).r > 0.0;
+            }
+        }
+        vec2 uv = min((vec2(t) + in_vert * 0.5 + 0.5) * float(tile) / resolution, 1.0);
+        v_texcoord = uv;
+        gl_Position = is_active ? vec4(uv * 2.0 - 1.0, 0.0, 1.0) : vec4(-2.0, -2.0, 0.0, 1.0);
+    }
+"""
+
+# Reduces a sparse pass's two state textures to one texel per tile: 1 if any selected channel
+# differs. Only tiles dispatched this frame are read; the others still hold equal contents.
+ACTIVITY_SHADER = """
+    #version 330
+    uniform sampler2D state;
+    uniform sampler2D previous;
+    uniform sampler2D activity;
+    uniform int tile;
+    uniform int full;
+    uniform vec4 channels;
+    uniform float threshold;
+    out vec4 f_color;
+    void main() {
+        ivec2 tiles = textureSize(activity, 0);
+        ivec2 t = ivec2(gl_FragCoord.xy);
+        bool dispatched = full != 0;
+        for (int y = -1; y <= 1; y++) {
+            for (int x = -1; x <= 1; x++) {
+                dispatched = dispatched || texelFetch(activity, (t + ivec2(x, y) + tiles) % tiles, 0).r > 0.0;
+            }
+        }
+        float changed = 0.0;
+        if (dispatched) {
+            ivec2 start = t * tile;
+            ivec2 end = min(start + tile, textureSize(state, 0));
+            for (int y = start.y; y < end.y; y++) {
+                for (int x = start.x; x < end.x; x++) {
+                    vec4 d = abs(texelFetch(state, ivec2(x, y), 0) - texelFetch(previous, ivec2(x, y), 0)) * channels;
+                    changed = max(changed, max(max(d.x, d.y), max(d.z, d.w)));
+                }
+            }
+        }
+        f_color = vec4(changed > threshold ? 1.0 : 0.0);
+    }
+"""
+
+
+def shader_source(key):
+    if key in SHADERS:
+        return SHADERS[key]
+    if key in PASS_SHADERS:
+        return PASS_SHADERS[key]
+    raise ValueError(f"Unknown shader '{key}'")
+
+
+class Resource:
+    # A named texture in a render graph. Its size is either fixed or a scale of the
+    # output size. Persistent resources keep their contents across frames (ping-pong);
+    # all others only live within a frame and share memory through the texture pool.
+    # A resource can pack `pack` cells per texel along x (e.g. 32 one-bit cells in 'u4');
+    # its size is then given in cells and the texture is `pack` times narrower.
+    def __init__(self, name, size=None, scale=1.0, components=4, dtype="f4", persistent=False, pack=1):
+        self.name = name
+        self.size = tuple(size) if size else None
+        self.scale = scale
+        self.components = components
+        self.dtype = dtype
+        self.persistent = persistent
+        self.pack = pack
+
+    def resolve_size(self, output_size, cells=None):
+        # Texture size for `cells` (default: the declared size, or a scale of the output)
+        cells = cells or self.size or (int(output_size[0] * self.scale), int(output_size[1] * self.scale))
+        return (max(1, cells[0] // self.pack), max(1, cells[1]))
+
+
+class RenderPass:
+    # One full-screen draw. `inputs` maps sampler uniforms to resource names and `outputs`
+    # lists the resources written (several for MRT). A pass with rate N runs every Nth frame.
+    # Simulation passes are repeated for every substep of the graph's fixed-step scheduler.
+    # A simulation pass with a `tile` size is sparse: it only updates tiles whose `activity`
+    # channels changed in the last frame, plus their neighbours, and every tile each `refresh`
+    # steps (0 = only on the init step). This suits local rules whose static regions stay static.
+    # Skipped tiles are not written, so `activity` must cover every channel the rule changes.
+    # `reach` is how far, in texels, the rule reads per step; frames with more steps than a
+    # tile can absorb (steps * reach > tile) update every tile.
+    # A pass with a `convolution` ({"channel", "ri", "ra"}) has no shader: it writes the disk and
+    # annulus means of one channel of its input by FFT, see DiskConvolution. The "ri" and "ra"
+    # uniforms given to the executor override its radii.
+    def __init__(self, name, source, inputs=None, outputs=(SCREEN,), rate=1, simulation=False,
+                 tile=None, activity="rgba", refresh=0, reach=1, convolution=None):
+        self.name = name
+        self.source = source
+        self.inputs = dict(inputs or {})
+        self.outputs = list(outputs)
+        self.rate = rate
+        self.simulation = simulation
+        self.tile = tile
+        self.activity = activity
+        self.refresh = refresh
+        self.reach = reach
+        self.convolution = convolution
+        self.program = None
+        self.vao = None
+        # Sparse passes also get the instanced tile program and the activity reduction
+        self.tile_program = None
+        self.tile_vao = None
+        self.activity_program = None
+        self.activity_vao = None
+
+
+class RenderGraph:
+    def __init__(self, name, passes, resources=None, steps=1):
+        self.name = name
+        self.passes = passes
+        # Simulation steps per displayed frame
+        self.steps = steps
+        self.resources = {r.name: r for r in (resources or [])}
+        self._validate()
+
+        # Index of the last pass reading each transient, after which its texture is recycled
+        self.last_reads = {}
+        for index, render_pass in enumerate(self.passes):
+            for resource in render_pass.inputs.values():
+                self.last_reads[resource] = index
+
+    @property
+    def has_feedback(self):
+        return any(r.persistent for r in self.resources.values())
+
+    @classmethod
+    def from_declaration(cls, name, declaration):
+        resources = [Resource(res_name, **options) for res_name, options in declaration.get("resources", {}).items()]
+        passes = [
+            RenderPass(p["name"], shader_source(p["shader"]) if "shader" in p else None, p.get("inputs"),
+                       p.get("outputs", [SCREEN]), p.get("rate", 1), p.get("simulation", False), p.get("tile"),
+                       p.get("activity", "rgba"), p.get("refresh", 0), p.get("reach", 1),
+                       p.get("convolution"))
+            for p in declaration["passes"]
+        ]
+        return cls(name, passes, resources, declaration.get("steps", 1))
+
+    @classmethod
+    def single_pass(cls, name, source):
+        return cls(name, [RenderPass("main", source)])
+
+    def _validate(self):
+        written = set()
+        simulation = [render_pass.simulation for render_pass in self.passes]
+        if simulation != sorted(simulation, reverse=True):
+            raise ValueError(f"Graph '{self.name}' must list its simulation passes first")
+        for render_pass in self.passes:
+            for resource in render_pass.inputs.values():
+                if resource not in self.resources:
+                    raise ValueError(f"Pass '{render_pass.name}' reads unknown resource '{resource}'")
+                if not self.resources[resource].persistent and resource not in written:
+                    raise ValueError(f"Pass '{render_pass.name}' reads '{resource}' before it is written")
+            for resource in render_pass.outputs:
+                if resource == SCREEN:
+                    continue
+                if resource not in self.resources:
+                    raise ValueError(f"Pass '{render_pass.name}' writes unknown resource '{resource}'")
+                persistent = self.resources[resource].persistent
+                if not persistent and resource in render_pass.inputs.values():
+                    raise ValueError(f"Pass '{render_pass.name}' reads and writes transient '{resource}'")
+                if not persistent and render_pass.rate != 1:
+                    raise ValueError(f"Pass '{render_pass.name}' runs at a reduced rate, so '{resource}' must be persistent")
+                written.add(resource)
+            if SCREEN in render_pass.outputs and len(render_pass.outputs) > 1:
+                raise ValueError(f"Pass '{render_pass.name}' cannot write the screen together with textures")
+            if SCREEN in render_pass.outputs and render_pass.simulation:
+                raise ValueError(f"Simulation pass '{render_pass.name}' cannot write the screen")
+            if render_pass.tile and not (render_pass.simulation and len(render_pass.outputs) == 1
+                                         and self.resources[render_pass.outputs[0]].persistent):
+                raise ValueError(f"Sparse pass '{render_pass.name}' must be a simulation pass writing one persistent texture")
+            if render_pass.convolution is not None:
+                if not (render_pass.simulation and len(render_pass.inputs) == 1 and len(render_pass.outputs) == 1):
+                    raise ValueError(f"Convolution pass '{render_pass.name}' must be a simulation pass with one input and one output")
+                if not all(self.resources[r].persistent for r in list(render_pass.inputs.values()) + render_pass.outputs):
+                    raise ValueError(f"Convolution pass '{render_pass.name}' must read and write persistent textures")
+            elif render_pass.source is None:
+                raise ValueError(f"Pass '{render_pass.name}' has no shader")
+
+
+def pass_programs(render_pass):
+    # (fragment source, vertex shader or None for the default) of every program a pass uses
+    if render_pass.convolution is not None:
+        return []
+    programs = [(render_pass.source, None)]
+    if render_pass.tile:
+        programs += [(render_pass.source, TILE_VERTEX_SHADER), (ACTIVITY_SHADER, None)]
+    return programs
+
+
+def graph_for_shader(name):
+    if name in SHADER_GRAPHS:
+        return RenderGraph.from_declaration(name, SHADER_GRAPHS[name])
+    return RenderGraph.single_pass(name, shader_source(name))
+
+
+class TexturePool:
+    # Hands out textures by size and format. Transient textures return here after their
+    # last reader, so passes later in the frame (or other graphs) alias the same memory.
+    def __init__(self, ctx):
+        self.ctx = ctx
+        self.free = {}
+
+    def acquire(self, size, components, dtype):
+        textures = self.free.get((tuple(size), components, dtype))
+        if textures:
+            return textures.pop()
+        texture = self.ctx.texture(size, components, dtype=dtype)
+        if dtype[0] in "iu":
+            # Integer textures cannot be filtered
+            texture.filter = (moderngl.NEAREST, moderngl.NEAREST)
+        return texture
+
+    def release(self, texture):
+        self.free.setdefault((texture.size, texture.components, texture.dtype), []).append(texture)
+
+    def trim(self):
+        for textures in self.free.values():
+            for texture in textures:
+                texture.release()
+        self.free = {}
+
+
+class GraphExecutor:
+    def __init__(self, ctx, profiler=None):
+        self.ctx = ctx
+        self.profiler = profiler
+        self.pool = TexturePool(ctx)
+        self.fbos = {}
+        self.graph = None
+        # Persistent resource name -> [latest texture, texture written next]
+        self.history = {}
+        self.frame = 0
+        # Simulation steps taken since the state was initialized
+        self.step = 0
+        self.output_size = None
+        # Overrides the declared size of persistent resources, e.g. a larger simulation grid
+        self.state_size = None
+        # Whether sparse passes skip inactive tiles; otherwise they update the whole state
+        self.sparse = False
+        # Sparse pass name -> [activity mask of the last frame, mask written next]
+        self.activity = {}
+        # Sparse pass name -> (masks, whether every tile was due in some step) of this frame
+        self.dispatched = {}
+        # Simulation steps of the current frame
+        self.frame_steps = 1
+        # Sparse pass name -> share of tiles dispatched, measured every TILE_REPORT_FRAMES frames
+        self.tile_ratios = {}
+        # FFT engine of convolution passes, created on first use
+        self.convolution = None
+
+    def set_graph(self, graph):
+        # State textures follow each graph's declaration, so drop the old ones entirely
+        self._release_history()
+        self._release_activity()
+        self.tile_ratios = {}
+        if self.convolution:
+            self.convolution.release()
+            self.convolution = None
+        self._trim()
+        self.graph = graph
+        self.frame = 0
+        self.step = 0
+
+    def execute(self, target, output_size, uniforms, state_size=None, steps=None, dt=1.0 / 60.0):
+        # Run every pass due this frame; `uniforms` are set on each program that declares them.
+        # Simulation passes run `steps` times (the graph's own count by default) on a fixed
+        # time step: they see time = step * dt and frame = step, where step 0 is the init step.
+        output_size = tuple(output_size)
+        self.state_size = tuple(state_size) if state_size else None
+        if output_size != self.output_size:
+            # Textures sized for the old output will never be handed out again
+            self._trim()
+            self.output_size = output_size
+        if not self.sparse and self.activity:
+            # Masks go stale while sparse updates are off
+            self._release_activity()
+            self.tile_ratios = {}
+
+        live = {}
+        passes = [(index, p) for index, p in enumerate(self.graph.passes) if self.frame % p.rate == 0]
+        simulation = [(index, p) for index, p in passes if p.simulation]
+        if simulation:
+            self.dispatched = {}
+            self.frame_steps = steps or self.graph.steps
+            # All substeps are timed as one scope: a query per substep would wrap the timer's
+            # ring within a frame and wait on queries still in flight
+            with self._timed("render/simulation"):
+                for _ in range(self.frame_steps):
+                    for index, render_pass in simulation:
+                        self._run_pass(index, render_pass, target, dict(uniforms, dt=dt), live)
+                    self.step += 1
+            # Masks are updated once per frame, so every substep dispatches the same tiles
+            for _, render_pass in simulation:
+                if render_pass.name in self.dispatched:
+                    self._update_activity(render_pass, *self.dispatched[render_pass.name])
+        for index, render_pass in passes:
+            if not render_pass.simulation:
+                self._run_pass(index, render_pass, target, uniforms, live)
+
+        self.frame += 1
+
+    def _run_pass(self, index, render_pass, target, uniforms, live):
+        if render_pass.convolution is not None:
+            self._convolve(render_pass, uniforms)
+            return
+
+        sparse = bool(render_pass.tile) and self.sparse
+        if sparse:
+            program, vao = render_pass.tile_program, render_pass.tile_vao
+        else:
+            program, vao = render_pass.program, render_pass.vao
+        for unit, (uniform, name) in enumerate(render_pass.inputs.items()):
+            texture = self._history(name)[0] if self.graph.resources[name].persistent else live[name]
+            texture.use(unit)
+            if uniform in program:
+                program[uniform].value = unit
+
+        if render_pass.outputs == [SCREEN]:
+            target.use()
+            self.ctx.viewport = (0, 0) + self.output_size
+            pass_size = self.output_size
+        else:
+            textures = []
+            for name in render_pass.outputs:
+                resource = self.graph.resources[name]
+                if resource.persistent:
+                    textures.append(self._history(name)[1])
+                else:
+                    if name in live:
+                        # Written again by a later substep
+                        self.pool.release(live.pop(name))
+                    texture = self.pool.acquire(resource.resolve_size(self.output_size), resource.components, resource.dtype)
+                    live[name] = texture
+                    textures.append(texture)
+            self._framebuffer(textures).use()
+            pass_size = textures[0].size
+
+        values = dict(uniforms, resolution=pass_size)
+        if render_pass.simulation:
+            # Read after the inputs are bound, since (re)allocating the state restarts at step 0
+            values.update(time=self.step * uniforms["dt"], frame=self.step)
+        if sparse:
+            masks, full = self._activity(render_pass, pass_size)
+            # Once a step of the frame wrote every tile, the rest of the frame must too, since
+            # the masks still describe the previous frame
+            full = full or (render_pass.name in self.dispatched and self.dispatched[render_pass.name][1])
+            self.dispatched[render_pass.name] = (masks, full)
+            unit = len(render_pass.inputs)
+            masks[0].use(unit)
+            values.update(activity=unit, tile=render_pass.tile, full=int(full))
+        for name, value in values.items():
+            if name in program:
+                program[name].value = value
+        with tracing.span(f"pass {render_pass.name}", "render"), \
+                self._timed(None if render_pass.simulation else f"render/{render_pass.name}"):
+            if sparse:
+                vao.render(moderngl.TRIANGLE_STRIP, instances=masks[0].width * masks[0].height)
+            else:
+                vao.render(moderngl.TRIANGLE_STRIP)
+
+        for name in render_pass.outputs:
+            if name in self.history:
+                self.history[name].reverse()
+        # Recycle transients nobody reads after this pass
+        for name in list(live):
+            if self.graph.last_reads.get(name, -1) <= index:
+                self.pool.release(live.pop(name))
+
+    def _timed(self, name):
+        # GPU timer scope, or nothing without a profiler or a name
+        return self.profiler.gpu(name) if self.profiler and name else nullcontext()
+
+    def _history(self, name):
+        resource = self.graph.resources[name]
+        size = resource.resolve_size(self.output_size, self.state_size)
+        pair = self.history.get(name)
+        if pair is None or pair[0].size != size:
+            nbytes = 2 * size[0] * size[1] * resource.components * int(resource.dtype[1])
+            limit = self.ctx.info["GL_MAX_TEXTURE_SIZE"]
+            if max(size) > limit:
+                raise ValueError(f"State '{name}' needs a {size[0]}x{size[1]} texture, but this GPU allows at most {limit}")
+            if nbytes > MAX_STATE_BYTES:
+                raise ValueError(f"State '{name}' at {size[0]}x{size[1]} would take {nbytes / 2**30:.1f} GB "
+                                 f"(limit {MAX_STATE_BYTES / 2**30:.0f} GB); choose a smaller simulation grid")
+            if pair:
+                self._release_history(name)
+            pair = [self.pool.acquire(size, resource.components, resource.dtype) for _ in range(2)]
+            for texture in pair:
+                self._framebuffer([texture]).clear()
+            self.history[name] = pair
+            self.step = 0
+            packing = f", {resource.pack} cells per texel" if resource.pack > 1 else ""
+            print(f"Allocated state '{name}': 2 x {size[0]}x{size[1]} {resource.components}x{resource.dtype}{packing} ({nbytes / 2**20:.1f} MB)")
+        return pair
+
+    def _convolve(self, render_pass, uniforms):
+        (source,) = render_pass.inputs.values()
+        (output,) = render_pass.outputs
+        state = self._history(source)[0]
+        target = self._history(output)[1]
+        options = render_pass.convolution
+        if self.convolution is None:
+            self.convolution = DiskConvolution(self.ctx)
+        with tracing.span(f"pass {render_pass.name}", "render"):
+            self.convolution.run(state, target, self._framebuffer, options.get("channel", 0),
+                                 uniforms.get("ri", options.get("ri", 3.0)), uniforms.get("ra", options.get("ra", 9.0)))
+        self.history[output].reverse()
+
+    def _activity(self, render_pass, state_size):
+        # The pass's activity masks, one texel per tile, and whether every tile is due this step
+        tiles = (-(-state_size[0] // render_pass.tile), -(-state_size[1] // render_pass.tile))
+        masks = self.activity.get(render_pass.name)
+        if masks is None or masks[0].size != tiles:
+            self._release_activity(render_pass.name)
+            masks = self.activity[render_pass.name] = [self.pool.acquire(tiles, 1, "f1") for _ in range(2)]
+            for mask in masks:
+                self._framebuffer([mask]).clear()
+            return masks, True
+        # A change spreads by `reach` texels per step, so the one-tile halo only covers a frame
+        # of up to tile / reach steps
+        if self.frame_steps * render_pass.reach > render_pass.tile:
+            return masks, True
+        return masks, self.step == 0 or bool(render_pass.refresh and self.step % render_pass.refresh == 0)
+
+    def _update_activity(self, render_pass, masks, full):
+        # Mark the tiles whose two state textures differ after the frame's last step. Those and
+        # their neighbours are dispatched next frame; every other tile holds the same contents
+        # in both textures, so skipping it leaves the ping-pong consistent.
+        state, previous = self.history[render_pass.outputs[0]]
+        program = render_pass.activity_program
+        values = {
+            "state": 0, "previous": 1, "activity": 2, "tile": render_pass.tile, "full": int(full),
+            "channels": tuple(float(c in render_pass.activity) for c in "rgba"), "threshold": ACTIVITY_THRESHOLD,
+        }
+        for name, value in values.items():
+            if name in program:
+                program[name].value = value
+        state.use(0)
+        previous.use(1)
+        masks[0].use(2)
+        self._framebuffer([masks[1]]).use()
+        self.ctx.viewport = (0, 0) + masks[1].size
+        with tracing.span(f"tiles {render_pass.name}", "render"), self._timed(f"render/{render_pass.name}/tiles"):
+            render_pass.activity_vao.render(moderngl.TRIANGLE_STRIP)
+        masks.reverse()
+
+        if self.frame % TILE_REPORT_FRAMES == 0:
+            # Tiles due next step: the active ones and their neighbours. Reading the small mask
+            # waits for the GPU, so it is only done now and then.
+            with tracing.span("read tiles", "render"):
+                active = np.frombuffer(masks[0].read(), dtype='u1').reshape(masks[0].height, masks[0].width) > 0
+            dispatched = active.copy()
+            for dy in (-1, 0, 1):
+                for dx in (-1, 0, 1):
+                    dispatched |= np.roll(active, (dy, dx), axis=(0, 1))
+            self.tile_ratios[render_pass.name] = float(dispatched.mean())
+
+    def _release_history(self, name=None):
+        names = [name] if name else list(self.history)
+        for name in names:
+            for texture in self.history.pop(name):
+                self._release_texture(texture)
+
+    def _release_activity(self, name=None):
+        names = [name] if name else list(self.activity)
+        for name in names:
+            for texture in self.activity.pop(name, ()):
+                self._release_texture(texture)
+
+    def _release_texture(self, texture):
+        for key in [key for key in self.fbos if texture.glo in key]:
+            self.fbos.pop(key).release()
+        texture.release()
+
+    def _framebuffer(self, textures):
+        key = tuple(texture.glo for texture in textures)
+        if key not in self.fbos:
+            self.fbos[key] = self.ctx.framebuffer(color_attachments=textures)
+        return self.fbos[key]
+
+    def _trim(self):
+        for fbo in self.fbos.values():
+            fbo.release()
+        self.fbos = {}
+        self.pool.trim()
@@ -1,21 +1,181 @@
+import hashlib
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
+
 import moderngl
 import numpy as np
 
+import tracing
+from hud import HUD
+from render_graph import GraphExecutor, RenderGraph, graph_for_shader, pass_programs
+
+# Pixel layouts the capture pass can produce for the encoder
+CAPTURE_LAYOUTS = ("bgr", "i420", "nv12")
+
+# Converts the rendered frame into the encoder's layout. Rows are written top-down so
+# glReadPixels returns the image already flipped. YUV layouts are written as a single
+# channel image of w x h*3/2 bytes using BT.601 limited range, matching OpenCV and ffmpeg.
+CAPTURE_FRAGMENT_SHADER = """
+    #version 330
+    uniform sampler2D tex;
+    uniform int capture_layout;
+    uniform ivec2 frame_size;
+    out vec4 f_color;
+
+    vec3 fetch(vec2 pixel) {
+        vec2 uv = pixel / vec2(frame_size);
+        return texture(tex, vec2(uv.x, 1.0 - uv.y)).rgb;
+    }
+
+    vec3 rgb_to_yuv(vec3 c) {
+        return vec3(
+            16.0 + dot(c, vec3(65.481, 128.553, 24.966)),
+            128.0 + dot(c, vec3(-37.797, -74.203, 112.0)),
+            128.0 + dot(c, vec3(112.0, -93.786, -18.214))
+        ) / 255.0;
+    }
+
+    void main() {
+        ivec2 p = ivec2(gl_FragCoord.xy);
+        if (capture_layout == 0) {
+            f_color = vec4(fetch(gl_FragCoord.xy).bgr, 1.0);
+            return;
+        }
+
+        int w = frame_size.x;
+        int h = frame_size.y;
+        if (p.y < h) {
+            f_color = vec4(rgb_to_yuv(fetch(gl_FragCoord.xy)).x, 0.0, 0.0, 1.0);
+            return;
+        }
+
+        // Chroma planes are packed into w-wide rows after the luma plane
+        int index = (p.y - h) * w + p.x;
+        int half_w = w / 2;
+        int plane_size = half_w * (h / 2);
+        int channel;
+        if (capture_layout == 1) {
+            channel = index < plane_size ? 1 : 2;
+            index = index % plane_size;
+        } else {
+            channel = 1 + index % 2;
+            index = index / 2;
+        }
+        // Sampling the shared corner of each 2x2 block averages it with bilinear filtering
+        vec2 block = vec2(index % half_w, index / half_w) * 2.0 + 1.0;
+        f_color = vec4(rgb_to_yuv(fetch(block))[channel], 0.0, 0.0, 1.0);
+    }
+"""
+
+
+def capture_components(layout):
+    # Bytes per texel of the capture framebuffer for a layout
+    return 3 if layout == "bgr" else 1
+
+
+
+def quad_vertex_array(ctx, program, quad_buffer):
+    # VAO over the (x, y, u, v) quad binding only the attributes the program kept: drivers drop
+    # in_texcoord from passes that ignore v_texcoord, and in_vert from the tile vertex shader
+    names = [name for name in ("in_vert", "in_texcoord") if name in program]
+    layout = " ".join("2f" if name in names else "8x" for name in ("in_vert", "in_texcoord"))
+    return ctx.vertex_array(program, [(quad_buffer, layout, *names)])
+
+
+def graph_program_keys(graph):
+    # ProgramCache keys of every program a graph draws with
+    return [ProgramCache.key(fragment_source, vertex_shader)
+            for render_pass in graph.passes for fragment_source, vertex_shader in pass_programs(render_pass)]
+
+
+def animate_params(zoom, offset, t):
+    # Auto-animation path shared by the live preview and offline renders
+    animated_zoom = zoom * (1.0 + 0.5 * np.sin(t * 0.5))
+    animated_offset = (
+        offset[0] + 0.2 * np.cos(t * 0.3),
+        offset[1] + 0.2 * np.sin(t * 0.4)
+    )
+    return animated_zoom, animated_offset
+
+
+class ProgramCache:
+    # LRU cache of linked programs and their VAOs keyed by a hash of the fragment source (and
+    # the vertex shader, if not the default one), so switching back to a recently used shader
+    # skips compilation entirely. Pinned entries, the programs of the current graph, are never
+    # evicted, so the cache can briefly hold more than `size` programs.
+    def __init__(self, ctx, vertex_shader, quad_buffer, size=16):
+        self.ctx = ctx
+        self.vertex_shader = vertex_shader
+        self.quad_buffer = quad_buffer
+        self.size = max(1, size)
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # Compile time in seconds of the last compilation, per source hash
+        self.compile_times = {}
+        self.pinned = set()
+
+    @staticmethod
+    def key(fragment_source, vertex_shader=None):
+        return hashlib.sha1(((vertex_shader or "") + fragment_source).encode()).hexdigest()
+
+    def __contains__(self, fragment_source):
+        return self.has(fragment_source)
+
+    def has(self, fragment_source, vertex_shader=None):
+        return self.key(fragment_source, vertex_shader) in self.entries
+
+    def get(self, fragment_source, vertex_shader=None):
+        # Returns (program, vao); raises if the shader does not compile
+        key = self.key(fragment_source, vertex_shader)
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+        self.misses += 1
+        start = time.perf_counter()
+        with tracing.span("compile program", "compile", key=key[:8]):
+            program = self.ctx.program(vertex_shader=vertex_shader or self.vertex_shader, fragment_shader=fragment_source)
+            vao = quad_vertex_array(self.ctx, program, self.quad_buffer)
+        self.compile_times[key] = time.perf_counter() - start
+
+        self.entries[key] = (program, vao)
+        self._evict()
+        return program, vao
+
+    def pin(self, keys):
+        # Protect exactly these entries from eviction, e.g. the programs a graph is drawing with
+        self.pinned = set(keys)
+        self._evict()
+
+    def _evict(self):
+        for key in [key for key in self.entries if key not in self.pinned]:
+            if len(self.entries) <= self.size:
+                break
+            old_program, old_vao = self.entries.pop(key)
+            old_vao.release()
+            old_program.release()
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self.entries),
+            "size": self.size,
+            "compile_times": dict(self.compile_times),
+        }
+
+
 class Renderer:
-    def __init__(self, ctx):
+    def __init__(self, ctx, program_cache_size=16, profiler=None):
         self.ctx = ctx
+        # Optional profiling.Profiler timing every pass on the GPU
+        self.profiler = profiler
         self.fbo = self.ctx.screen
-        self.feedback_textures = [
-            self.ctx.texture((1024, 1024), 4, dtype='f4'),
-            self.ctx.texture((1024, 1024), 4, dtype='f4')
-        ]
-        self.feedback_fbos = [
-            self.ctx.framebuffer(color_attachments=[self.feedback_textures[0]]),
-            self.ctx.framebuffer(color_attachments=[self.feedback_textures[1]])
-        ]
-        self.current_feedback = 0
-        
-        # Simple copy shader for feedback display
+
+        # Simple copy shader for presenting offscreen frames
         self.copy_program = self.ctx.program(
             vertex_shader="""
                 #version 330
@@ -45,6 +205,22 @@ class Renderer:
              1.0,  1.0, 1.0, 1.0,
              1.0, -1.0, 1.0, 0.0,
         ], dtype='f4'))
+        self.copy_vao = self.ctx.vertex_array(self.copy_program, [(self.quad_buffer, '2f 2f', 'in_vert', 'in_texcoord')])
+
+        # Final conversion pass that prepares frames for the encoder
+        self.capture_program = self.ctx.program(
+            vertex_shader="""
+                #version 330
+                in vec2 in_vert;
+                void main() {
+                    gl_Position = vec4(in_vert, 0.0, 1.0);
+                }
+            """,
+            fragment_shader=CAPTURE_FRAGMENT_SHADER
+        )
+        self.capture_vao = self.ctx.vertex_array(self.capture_program, [(self.quad_buffer, '2f 8x', 'in_vert')])
+        self.capture_source = None
+        self.capture_targets = {}
         
         self.vertex_shader = """
         #version 330
@@ -80,63 +256,224 @@ class Renderer:
             f_color = vec4(col, 1.0);
         }
         """
-        self.program = None
-        self.vao = None
+        self.graph = None
+        # Internal resolution as a fraction of the output; the result is scaled by present()
+        self.render_scale = 1.0
+        self.scale_fbo = None
+        # Internal size of the last rendered frame
+        self.render_size = None
+        # Simulation grid size (width, height) overriding the shader's declared state size
+        self.sim_size = None
+        # Simulation steps per frame overriding the shader's declared count, and the fixed step
+        self.sim_steps = None
+        self.sim_dt = 1.0 / 60.0
+        # (ri, ra) overriding the kernel radii of convolution passes, e.g. in Smooth Life
+        self.kernel_radii = None
+        self.program_cache = ProgramCache(self.ctx, self.vertex_shader, self.quad_buffer, program_cache_size)
+        self.executor = GraphExecutor(self.ctx, profiler)
+        self.warmup_fbo = None
+        self.hud = None
+        # CPU HashLife engine shown instead of the render graph while set, see hashlife.py
+        self.hashlife = None
+        self.hashlife_texture = None
 
-    def render(self, time, resolution, zoom=1.0, offset=(0.0, 0.0), fbo=None, is_feedback=False):
-        if not self.vao:
+    def render(self, time, resolution, zoom=1.0, offset=(0.0, 0.0), fbo=None):
+        # Run the current shader's render graph; `resolution` is the size of the final output
+        if not self.graph:
             return
-        
-        if is_feedback:
-            # Ping-pong for feedback effects like Game of Life
-            prev_idx = self.current_feedback
-            curr_idx = 1 - prev_idx
-            
-            # Render to current FBO
-            self.feedback_fbos[curr_idx].use()
-            self.feedback_textures[prev_idx].use(0)
-            
-            if 'prev_frame' in self.program:
-                self.program['prev_frame'].value = 0
-            
-            # For feedback shaders like Game of Life, the resolution should match the texture
-            self._set_uniforms(time, (1024, 1024), zoom, offset)
-            self.vao.render(moderngl.TRIANGLE_STRIP)
-            
-            # Now render the result to the screen using the copy shader
-            target_fbo = fbo if fbo else self.fbo
-            target_fbo.use()
-            self.feedback_textures[curr_idx].use(0)
-            
-            # Create a temporary VAO for the copy operation if needed,
-            # or just use the existing quad_buffer with the copy_program
-            copy_vao = self.ctx.vertex_array(self.copy_program, [(self.quad_buffer, '2f 2f', 'in_vert', 'in_texcoord')])
-            copy_vao.render(moderngl.TRIANGLE_STRIP)
-            
-            self.current_feedback = curr_idx
+
+        target_fbo = fbo if fbo else self.fbo
+        if self.hashlife:
+            self.render_size = tuple(resolution)
+            self.draw_hashlife(target_fbo, resolution, zoom, offset)
+            return
+
+        uniforms = {"time": time, "zoom": zoom, "offset": offset}
+        if self.kernel_radii:
+            uniforms.update(ri=self.kernel_radii[0], ra=self.kernel_radii[1])
+        if self.render_scale == 1.0:
+            self.render_size = tuple(resolution)
+            self.executor.execute(target_fbo, resolution, uniforms, self.sim_size, self.sim_steps, self.sim_dt)
+            return
+
+        size = (max(1, int(resolution[0] * self.render_scale)), max(1, int(resolution[1] * self.render_scale)))
+        self.render_size = size
+        # Keep the target's format so float outputs stay unquantized
+        attachments = target_fbo.color_attachments
+        dtype = attachments[0].dtype if attachments else 'f1'
+        if self.scale_fbo is None or self.scale_fbo.size != size or self.scale_fbo.color_attachments[0].dtype != dtype:
+            if self.scale_fbo:
+                self.scale_fbo.color_attachments[0].release()
+                self.scale_fbo.release()
+            self.scale_fbo = self.ctx.framebuffer(color_attachments=[self.ctx.texture(size, 4, dtype=dtype)])
+        self.executor.execute(self.scale_fbo, size, uniforms, self.sim_size, self.sim_steps, self.sim_dt)
+        with self.timed("render/upscale"), tracing.span("upscale", "render"):
+            self.present(self.scale_fbo.color_attachments[0], target_fbo, resolution)
+
+    def draw_hashlife(self, fbo, size, zoom, offset):
+        # Show the engine's latest image and ask for the next generation step at this view
+        self.hashlife.request(size, zoom, offset)
+        image = self.hashlife.latest()
+        if image is None:
+            fbo.use()
+            self.ctx.viewport = (0, 0) + tuple(size)
+            fbo.clear(0.0, 0.0, 0.0, 1.0)
+            return
+        height, width = image.shape[:2]
+        if self.hashlife_texture is None or self.hashlife_texture.size != (width, height):
+            if self.hashlife_texture:
+                self.hashlife_texture.release()
+            self.hashlife_texture = self.ctx.texture((width, height), 4)
+        self.hashlife_texture.write(image)
+        with self.timed("render/hashlife"), tracing.span("hashlife", "render"):
+            self.present(self.hashlife_texture, fbo, size)
+
+    def draw_hud(self, fbo, size, lines, frame_times, budget_ms, scale=2):
+        # Overlay the performance HUD; callers draw it after capture to keep it out of recordings
+        if self.hud is None:
+            self.hud = HUD(self.ctx, self.quad_buffer)
+        with self.timed("hud"), tracing.span("hud", "render"):
+            self.hud.draw(fbo, size, lines, frame_times, budget_ms, scale)
+
+    def timed(self, name):
+        # GPU timing scope for the profiler, if there is one
+        return self.profiler.gpu(name) if self.profiler else nullcontext()
+
+    def present(self, texture, fbo, size=None):
+        # Draw a texture over the whole target with filtered scaling, e.g. a 4K frame into the preview.
+        # `size` sets the viewport for targets that do not know their own size, like the screen.
+        width, height = size or fbo.size
+        if texture.width > width or texture.height > height:
+            texture.build_mipmaps()
+            texture.filter = (moderngl.LINEAR_MIPMAP_LINEAR, moderngl.LINEAR)
+        else:
+            texture.filter = (moderngl.LINEAR, moderngl.LINEAR)
+        fbo.use()
+        if size:
+            self.ctx.viewport = (0, 0, width, height)
+        texture.use(0)
+        self.copy_vao.render(moderngl.TRIANGLE_STRIP)
+
+    def capture(self, source, layout="bgr", size=None, slot="record"):
+        # Convert a rendered frame into the encoder's layout in a dedicated FBO and return it.
+        # `source` is a texture or a framebuffer, which is first copied into a texture.
+        # `size` scales the frame on the way; each `slot` keeps its own target FBO.
+        if layout not in CAPTURE_LAYOUTS:
+            raise ValueError(f"Unknown capture layout '{layout}'")
+
+        if isinstance(source, moderngl.Texture):
+            texture = source
         else:
-            # Normal single-pass rendering
-            target_fbo = fbo if fbo else self.fbo
-            target_fbo.use()
-            self.ctx.clear(0.1, 0.2, 0.3)
-            self._set_uniforms(time, resolution, zoom, offset)
-            self.vao.render(moderngl.TRIANGLE_STRIP)
-
-    def _set_uniforms(self, time, resolution, zoom, offset):
-        if 'time' in self.program:
-            self.program['time'].value = time
-        if 'resolution' in self.program:
-            self.program['resolution'].value = resolution
-        if 'zoom' in self.program:
-            self.program['zoom'].value = zoom
-        if 'offset' in self.program:
-            self.program['offset'].value = offset
+            if self.capture_source is None or self.capture_source.size != source.size:
+                if self.capture_source:
+                    self.capture_source.release()
+                self.capture_source = self.ctx.texture(source.size, 4)
+            self.ctx.copy_framebuffer(self.capture_source, source)
+            texture = self.capture_source
+
+        width, height = size or texture.size
+        target_size = (width, height)
+        if layout != "bgr":
+            # 4:2:0 subsampling needs even dimensions plus half as many rows again for chroma
+            width, height = width & ~1, height & ~1
+            target_size = (width, height * 3 // 2)
+
+        target_fbo = self.capture_targets.get(slot)
+        if target_fbo is None or target_fbo.size != target_size:
+            if target_fbo:
+                for attachment in target_fbo.color_attachments:
+                    attachment.release()
+                target_fbo.release()
+            target = self.ctx.texture(target_size, 4 if layout == "bgr" else 1)
+            target_fbo = self.ctx.framebuffer(color_attachments=[target])
+            self.capture_targets[slot] = target_fbo
+
+        target_fbo.use()
+        texture.filter = (moderngl.LINEAR, moderngl.LINEAR)
+        texture.use(0)
+        self.capture_program['tex'].value = 0
+        self.capture_program['capture_layout'].value = CAPTURE_LAYOUTS.index(layout)
+        self.capture_program['frame_size'].value = (width, height)
+        with self.timed(f"capture/{slot}"), tracing.span(f"capture {slot}", "convert", layout=layout):
+            self.capture_vao.render(moderngl.TRIANGLE_STRIP)
+        return target_fbo
+
+    def warm_shader(self, name, keep=True):
+        # Compile every pass of a shader's graph without making it current. With keep=False
+        # the programs are only validated and released, e.g. when the cache has no room left.
+        # Returns (success, seconds, message).
+        start = time.perf_counter()
+        try:
+            sources = {program for render_pass in graph_for_shader(name).passes for program in pass_programs(render_pass)}
+            with tracing.span("warm_shader", "compile", shader=name):
+                for fragment_source, vertex_shader in sources:
+                    if keep:
+                        program, vao = self.program_cache.get(fragment_source, vertex_shader)
+                    else:
+                        program = self.ctx.program(vertex_shader=vertex_shader or self.vertex_shader, fragment_shader=fragment_source)
+                        vao = quad_vertex_array(self.ctx, program, self.quad_buffer)
+
+                    # Draw once into a 1x1 target so drivers that compile lazily finish the work now
+                    if self.warmup_fbo is None:
+                        self.warmup_fbo = self.ctx.framebuffer(color_attachments=[self.ctx.texture((1, 1), 4)])
+                    self.warmup_fbo.use()
+                    vao.render(moderngl.TRIANGLE_STRIP)
+
+                    if not keep:
+                        vao.release()
+                        program.release()
+            return True, time.perf_counter() - start, "Shader compiled"
+        except Exception as e:
+            return False, time.perf_counter() - start, str(e)
+
+    def uncached_programs(self, name):
+        # Number of programs of a shader's graph that warming it would add to the cache
+        try:
+            graph = graph_for_shader(name)
+        except ValueError:
+            return 0
+        return len({key for key in graph_program_keys(graph) if key not in self.program_cache.entries})
+
+    def load_shader(self, name):
+        # Switch to a built-in shader and the render graph it declares
+        try:
+            graph = graph_for_shader(name)
+        except ValueError as e:
+            return False, str(e)
+        return self.set_graph(graph)
 
     def update_shader(self, fragment_source):
+        # Switch to a single-pass shader given by its fragment source
+        return self.set_graph(RenderGraph.single_pass("custom", fragment_source))
+
+    def set_graph(self, graph):
+        # Keep the current graph's programs alive until the new one has compiled
+        current = self.program_cache.pinned
+        self.program_cache.pinned = current | set(graph_program_keys(graph))
         try:
-            new_program = self.ctx.program(vertex_shader=self.vertex_shader, fragment_shader=fragment_source)
-            self.program = new_program
-            self.vao = self.ctx.vertex_array(self.program, [(self.quad_buffer, '2f 2f', 'in_vert', 'in_texcoord')])
-            return True, "Shader updated"
+            compiled = 0
+            compile_time = 0.0
+            with tracing.span("update_shader", "compile", shader=graph.name):
+                for render_pass in graph.passes:
+                    programs = []
+                    for fragment_source, vertex_shader in pass_programs(render_pass):
+                        cached = self.program_cache.has(fragment_source, vertex_shader)
+                        programs.append(self.program_cache.get(fragment_source, vertex_shader))
+                        if not cached:
+                            compiled += 1
+                            compile_time += self.program_cache.compile_times[ProgramCache.key(fragment_source, vertex_shader)]
+                    if programs:
+                        render_pass.program, render_pass.vao = programs[0]
+                    if render_pass.tile:
+                        render_pass.tile_program, render_pass.tile_vao = programs[1]
+                        render_pass.activity_program, render_pass.activity_vao = programs[2]
         except Exception as e:
+            self.program_cache.pin(current)
             return False, str(e)
+
+        self.program_cache.pin(graph_program_keys(graph))
+        self.graph = graph
+        self.executor.set_graph(graph)
+        if not compiled:
+            return True, "Shader updated (cached)"
+        return True, f"Shader updated (compiled in {compile_time * 1000:.0f} ms)"
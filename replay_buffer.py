@@ -0,0 +1,68 @@
+import threading
+
+import numpy as np
+
+from video_encoder import VideoEncoder
+
+
+class ReplayBuffer:
+    # Fixed-size ring holding the most recent frames for "save the last N seconds".
+    # All storage is allocated up front, so the memory cost is known before capture starts.
+    def __init__(self, seconds, fps, frame_shape):
+        self.fps = fps
+        self.capacity = max(1, int(round(seconds * fps)))
+        self.frame_shape = tuple(frame_shape)
+        self.frames = np.empty((self.capacity,) + self.frame_shape, dtype='u1')
+        self.timestamps = np.zeros(self.capacity, dtype='f8')
+        self.count = 0
+        self.next_index = 0
+        self.saving = False
+        self.lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        return self.frames.nbytes + self.timestamps.nbytes
+
+    @property
+    def duration(self):
+        return self.count / self.fps
+
+    def push(self, frame, timestamp):
+        # Frames arriving while a save is in progress are skipped so the saved clip stays intact
+        with self.lock:
+            if self.saving:
+                return False
+            self.frames[self.next_index] = frame
+            self.timestamps[self.next_index] = timestamp
+            self.next_index = (self.next_index + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+        return True
+
+    def clear(self):
+        with self.lock:
+            self.count = 0
+            self.next_index = 0
+
+    def save(self, path, pixel_format="bgr", backend="opencv", **options):
+        # Encode the buffered frames oldest first; meant to run on a background thread
+        with self.lock:
+            if self.saving:
+                raise Exception("A replay is already being saved.")
+            if self.count == 0:
+                raise Exception("The replay buffer is empty.")
+            self.saving = True
+            order = [(self.next_index - self.count + i) % self.capacity for i in range(self.count)]
+
+        try:
+            # Use the measured capture rate so the replay plays back in real time
+            span = self.timestamps[order[-1]] - self.timestamps[order[0]]
+            fps = (len(order) - 1) / span if span > 0 else self.fps
+            encoder = VideoEncoder(path, fps, pixel_format=pixel_format, backend=backend, **options)
+            for index in order:
+                encoder.write(self.frames[index])
+            encoder.close()
+            return len(order)
+        finally:
+            self.clear()
+            with self.lock:
+                self.saving = False
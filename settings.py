@@ -0,0 +1,82 @@
+import json
+import os
+
+SETTINGS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "settings.json")
+
+DEFAULTS = {
+    # Maximum number of frames waiting for the encoder thread
+    "record_queue_size": 64,
+    # What to do when the encoder falls behind: "block" the render loop or "drop" frames
+    "record_backpressure": "block",
+    # Number of pixel-buffer objects used for asynchronous frame readback
+    "readback_ring_depth": 3,
+    # Layout produced on the GPU for recorded frames: "bgr", "i420" or "nv12"
+    "capture_format": "bgr",
+    # Recorded frame size as [width, height], or null to use the window size
+    "record_size": None,
+    # Recorded frames are rendered on a fixed time step of 1 / record_fps seconds
+    "record_fps": 60,
+    # Shaders render at render_scale times the output size and are filtered up or down to it
+    "render_scale": 1.0,
+    # Lower the render scale automatically (down to dynamic_min_scale) to hold target_frame_ms
+    "dynamic_resolution": False,
+    "target_frame_ms": 16.0,
+    "dynamic_min_scale": 0.5,
+    # Grid size of feedback simulations, or null to use each shader's declared size
+    "sim_grid_size": None,
+    # Simulation steps per displayed frame (null = each shader's own count) and the fixed step in seconds
+    "sim_steps": None,
+    "sim_dt": 1.0 / 60.0,
+    # Let simulations that support it update only the tiles that are changing. Random reseeds
+    # then only reach quiet tiles every few steps, so it is off by default.
+    "sparse_tiles": False,
+    # Inner and outer kernel radii of Smooth Life, in grid cells
+    "kernel_ri": 3.0,
+    "kernel_ra": 9.0,
+    # HashLife: RLE pattern file (null = a random soup of hashlife_soup_size cells square),
+    # generations per frame as a power of two, and the node count that triggers eviction
+    "hashlife_pattern": None,
+    "hashlife_soup_size": 512,
+    "hashlife_step_exponent": 3,
+    "hashlife_max_nodes": 2000000,
+    # Show the performance HUD, and whether it is burned into recordings and replays
+    "hud": False,
+    "hud_in_recordings": False,
+    # Number of frames the profiler keeps per timing, and how often to print its report (0 = never)
+    "profile_window": 300,
+    "profile_report_seconds": 0,
+    # Check for GL errors after every paint (waits for the GPU each frame)
+    "gl_debug": False,
+    # Number of compiled shader programs kept for instant switching
+    "program_cache_size": 16,
+    # Compile every shader during idle frames after startup so switching never stalls
+    "warmup_shaders": True,
+    # Shaders warmed up first; the rest follow in their registered order
+    "warmup_priority": [],
+    # Milliseconds of compile work allowed per frame (at least one shader per frame)
+    "warmup_budget_ms": 8,
+    # Encoder for exported videos: "opencv" (encoder_fourcc) or "ffmpeg" (codec, CRF and preset)
+    "encoder_backend": "opencv",
+    "encoder_fourcc": "mp4v",
+    # ffmpeg codec: "h264", "h265" or "prores" (ProRes needs a .mov output)
+    "encoder_codec": "h264",
+    "encoder_crf": 18,
+    "encoder_preset": "medium",
+    # Instant replay keeps the last replay_seconds of frames in a preallocated ring buffer
+    "replay_enabled": False,
+    "replay_seconds": 30,
+    "replay_fps": 30,
+    # Replay frames are downscaled by this factor and stored as YUV 4:2:0 to bound memory
+    "replay_scale": 0.5,
+}
+
+
+def load_settings(path=SETTINGS_PATH):
+    settings = dict(DEFAULTS)
+    if os.path.exists(path):
+        try:
+            with open(path) as f:
+                settings.update(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"Could not read settings from {path}: {e}")
+    return settings
@@ -0,0 +1,167 @@
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from profiling import Profiler
+from render_cli import create_standalone_context
+from render_graph import graph_for_shader
+from renderer import Renderer
+from shaders import SHADERS
+
+BENCHMARK_VERSION = 1
+
+RESOLUTIONS = {
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+    "4k": (3840, 2160),
+}
+SIM_SIZES = (512, 1024, 2048)
+
+
+def result_key(result):
+    key = f"{result['shader']} @ {result['resolution']}"
+    if result.get("sim_size"):
+        key += f" sim {result['sim_size']}"
+    return key
+
+
+def benchmark_config(ctx, renderer, shader_name, size, frames, warmup, sim_size=None, fps=60):
+    # Render warmup + frames frames synchronously; returns per-frame and per-pass timings
+    texture = ctx.texture(size, 4)
+    fbo = ctx.framebuffer(color_attachments=[texture])
+    renderer.sim_size = (sim_size, sim_size) if sim_size else None
+    # Reloading restarts the simulation from its initial state
+    renderer.load_shader(shader_name)
+
+    frame_ms = []
+    readback_ms = []
+    try:
+        for i in range(warmup + frames):
+            if i == warmup:
+                renderer.profiler.reset()
+            renderer.profiler.next_frame()
+            start = time.perf_counter()
+            renderer.render(i / fps, size, fbo=fbo)
+            ctx.finish()
+            rendered = time.perf_counter()
+            renderer.capture(texture, "bgr", slot="benchmark").read(components=3, alignment=1)
+            read = time.perf_counter()
+            if i >= warmup:
+                frame_ms.append((rendered - start) * 1000.0)
+                readback_ms.append((read - rendered) * 1000.0)
+    finally:
+        fbo.release()
+        texture.release()
+
+    frame_ms = np.array(frame_ms)
+    passes = {name[len("render/"):]: entry for name, entry in renderer.profiler.stats().items() if name.startswith("render/")}
+    return {
+        "mean_ms": float(frame_ms.mean()),
+        "p95_ms": float(np.percentile(frame_ms, 95)),
+        "readback_ms": float(np.mean(readback_ms)),
+        "gpu_passes": {name: {"mean_ms": entry["mean"], "p95_ms": entry["p95"]} for name, entry in passes.items()},
+    }
+
+
+def run_benchmark(shader_names, resolutions, sim_sizes, frames, warmup):
+    ctx = create_standalone_context()
+    renderer = Renderer(ctx, program_cache_size=4, profiler=Profiler(ctx, window=frames))
+    results = []
+    for shader_name in shader_names:
+        # Compile once outside the timed runs, validating every pass of the shader's graph
+        success, seconds, msg = renderer.warm_shader(shader_name, keep=False)
+        if not success:
+            print(f"{shader_name:<24} failed to compile: {msg}")
+            results.append({"shader": shader_name, "resolution": None, "error": msg})
+            continue
+
+        feedback = graph_for_shader(shader_name).has_feedback
+        for resolution in resolutions:
+            for sim_size in (sim_sizes if feedback else [None]):
+                result = {"shader": shader_name, "resolution": resolution, "sim_size": sim_size, "compile_ms": seconds * 1000.0}
+                result.update(benchmark_config(ctx, renderer, shader_name, RESOLUTIONS[resolution], frames, warmup, sim_size))
+                results.append(result)
+                print(f"{result_key(result):<40} {result['mean_ms']:8.2f} ms mean {result['p95_ms']:8.2f} ms p95 "
+                      f"{result['readback_ms']:7.2f} ms readback {result['compile_ms']:7.1f} ms compile")
+
+    return {
+        "version": BENCHMARK_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "gl_renderer": ctx.info["GL_RENDERER"],
+        "frames": frames,
+        "warmup": warmup,
+        "results": results,
+    }
+
+
+def load_results(path):
+    with open(path) as f:
+        data = json.load(f)
+    if data.get("version") != BENCHMARK_VERSION:
+        raise ValueError(f"Unsupported benchmark version {data.get('version')} in {path}")
+    return data
+
+
+def compare(current, baseline, threshold=0.1):
+    # Returns (key, metric, baseline ms, current ms) for every timing that grew beyond the threshold
+    if current["gl_renderer"] != baseline["gl_renderer"]:
+        print(f"Warning: baseline was recorded on {baseline['gl_renderer']}, not {current['gl_renderer']}")
+    previous = {result_key(r): r for r in baseline["results"] if "error" not in r}
+    regressions = []
+    for result in current["results"]:
+        if "error" in result:
+            continue
+        key = result_key(result)
+        if key not in previous:
+            continue
+        for metric in ("mean_ms", "p95_ms"):
+            before, after = previous[key][metric], result[metric]
+            if after > before * (1.0 + threshold):
+                regressions.append((key, metric, before, after))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every shader headlessly and compare against a baseline.")
+    parser.add_argument("--shaders", nargs="+", help="Shader names to run (default: all)")
+    parser.add_argument("--resolutions", nargs="+", choices=list(RESOLUTIONS), default=list(RESOLUTIONS))
+    parser.add_argument("--sim-sizes", nargs="+", type=int, default=list(SIM_SIZES), help="Grid sizes for feedback shaders")
+    parser.add_argument("--frames", type=int, default=120, help="Timed frames per configuration")
+    parser.add_argument("--warmup", type=int, default=10, help="Untimed frames before each configuration")
+    parser.add_argument("-o", "--output", help="Write the results to this JSON file")
+    parser.add_argument("--input", help="Use results from this JSON file instead of running the benchmark")
+    parser.add_argument("--compare", metavar="BASELINE", help="Flag shaders that got slower than in this results file")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Allowed slowdown before flagging, e.g. 0.1 for 10%%")
+    args = parser.parse_args(argv)
+
+    if args.input:
+        current = load_results(args.input)
+    else:
+        names = args.shaders or list(SHADERS)
+        unknown = [name for name in names if name not in SHADERS]
+        if unknown:
+            print(f"Unknown shaders: {', '.join(unknown)}")
+            return 2
+        current = run_benchmark(names, args.resolutions, args.sim_sizes, args.frames, args.warmup)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"Wrote {len(current['results'])} results to {args.output}")
+
+    if args.compare:
+        regressions = compare(current, load_results(args.compare), args.threshold)
+        for key, metric, before, after in regressions:
+            print(f"REGRESSION {key:<40} {metric} {before:.2f} -> {after:.2f} ms (+{(after / before - 1.0) * 100:.0f}%)")
+        if regressions:
+            print(f"{len(regressions)} timings regressed beyond {args.threshold * 100:.0f}%")
+            return 1
+        print("No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -397,6 +397,7 @@ SHADERS = {
     "Reaction Diffusion": """
         #version 330
         uniform float time;
+        uniform int frame;
         uniform vec2 resolution;
         uniform sampler2D prev_frame;
         out vec4 f_color;
@@ -411,7 +412,7 @@ SHADERS = {
             vec2 texel = 1.0 / resolution;
 
             // Initial state: Seed with multiple spots and noise
-            if (time < 0.5) {
+            if (frame == 0) {
                 float seed = 0.0;
                 for(int i=0; i<15; i++) {
                     vec2 pos = vec2(hash(vec2(float(i), 1.23)), hash(vec2(float(i), 4.56)));
@@ -500,6 +501,7 @@ SHADERS = {
     "Slime Mold": """
         #version 330
         uniform float time;
+        uniform int frame;
         uniform vec2 resolution;
         uniform sampler2D prev_frame;
         out vec4 f_color;
@@ -514,7 +516,7 @@ SHADERS = {
             vec2 texel = 1.0 / resolution;
 
             // Initial state: R=Trail, G=Heading, B=AgentDensity
-            if (time < 0.5) {
+            if (frame == 0) {
                 float r = hash(uv);
                 f_color = vec4(0.0, hash(uv + 1.23), r > 0.99 ? 1.0 : 0.0, 1.0);
                 return;
@@ -576,6 +578,7 @@ SHADERS = {
     "Cellular Automata 3D": """
         #version 330
         uniform float time;
+        uniform int frame;
         uniform vec2 resolution;
         uniform sampler2D prev_frame;
         out vec4 f_color;
@@ -645,7 +648,7 @@ SHADERS = {
                 vec3 p_sim = get_3d_coord(uv / 0.5);
 
                 // Initial state or periodic re-seeding
-                if (time < 0.5 || hash(p_sim + floor(time)) > 0.9999) {
+                if (frame == 0 || hash(p_sim + floor(time)) > 0.9999) {
                     float h = hash(p_sim + time);
                     f_color = vec4(vec3(h > 0.98 ? 1.0 : 0.0), 1.0);
                     return;
@@ -737,6 +740,7 @@ SHADERS = {
     "Game of Life": """
         #version 330
         uniform float time;
+        uniform int frame;
         uniform vec2 resolution;
         uniform sampler2D prev_frame;
         out vec4 f_color;
@@ -752,7 +756,7 @@ SHADERS = {
 
             // Initial state or periodic re-seeding to prevent total darkness
             // Increased re-seeding probability and made it more localized
-            if (time < 0.5 || hash(uv + floor(time*10.0)) > 0.999) {
+            if (frame == 0 || hash(uv + floor(time*10.0)) > 0.999) {
                 float r = hash(uv + time);
                 if (r > 0.995) {
                     f_color = vec4(1.0, 1.0, 1.0, 1.0);
@@ -809,8 +813,11 @@ SHADERS = {
     "Smooth Life": """
         #version 330
         uniform float time;
+        uniform int frame;
         uniform vec2 resolution;
         uniform sampler2D prev_frame;
+        // Mean state over the inner disk (r) and the annulus around it (g)
+        uniform sampler2D disks;
         out vec4 f_color;
         in vec2 v_texcoord;
 
@@ -829,34 +836,17 @@ SHADERS = {
 
         void main() {
             vec2 uv = v_texcoord;
-            vec2 texel = 1.0 / resolution;
 
-            if (time < 0.5) {
+            if (frame == 0) {
                 float r = hash(uv);
                 f_color = vec4(vec3(r > 0.9 ? 1.0 : 0.0), r > 0.9 ? 1.0 : 0.0);
                 return;
             }
 
-            // Larger kernel for SmoothLife
-            float inner = 0.0;
-            float outer = 0.0;
-            float ri = 3.0;
-            float ra = 9.0;
-            
-            for(float y=-ra; y<=ra; y++) {
-                for(float x=-ra; x<=ra; x++) {
-                    float d = length(vec2(x, y));
-                    float val = texture(prev_frame, uv + vec2(x, y) * texel).a;
-                    if (d <= ri) {
-                        inner += val;
-                    } else if (d <= ra) {
-                        outer += val;
-                    }
-                }
-            }
-            
-            inner /= (3.14159 * ri * ri);
-            outer /= (3.14159 * (ra * ra - ri * ri));
+            // Kernel integrals come from the FFT convolution pass, whatever the radii
+            vec2 means = texture(disks, uv).rg;
+            float inner = means.r;
+            float outer = means.g;
 
             float current = texture(prev_frame, uv).a;
             
@@ -1203,6 +1193,7 @@ SHADERS = {
     "Smoke / Ink": """
         #version 330
         uniform float time;
+        uniform int frame;
         uniform vec2 resolution;
         uniform sampler2D prev_frame;
         out vec4 f_color;
@@ -1217,7 +1208,7 @@ SHADERS = {
             vec2 texel = 1.0 / resolution;
 
             // Initial state
-            if (time < 0.5) {
+            if (frame == 0) {
                 f_color = vec4(0.0, 0.0, 0.0, 1.0);
                 return;
             }
@@ -1326,6 +1317,7 @@ SHADERS = {
     "Flow Field Simulation": """
         #version 330
         uniform float time;
+        uniform int frame;
         uniform vec2 resolution;
         uniform sampler2D prev_frame;
         out vec4 f_color;
@@ -1352,7 +1344,7 @@ SHADERS = {
             vec2 uv = v_texcoord;
             vec2 texel = 1.0 / resolution;
 
-            if (time < 0.5) {
+            if (frame == 0) {
                 f_color = vec4(0.0, 0.0, 0.0, 1.0);
                 return;
             }
@@ -1397,3 +1389,221 @@ SHADERS = {
         }
     """
 }
+
+# Bit-packed Game of Life: 32 cells per 'u4' texel, bit b of texel (x, y) holding cell
+# (32 * x + b, y). Neighbour counts for all 32 cells are summed at once with bitwise
+# full adders into four bit planes. Compiled with SMOOTH_RULE, each cell instead follows
+# the smooth rule of "Game of Life" as a per-step probability of being alive.
+BIT_LIFE_SHADER = """
+    uniform int frame;
+    uniform usampler2D prev_frame;
+    out uint f_state;
+
+    ivec2 size;
+    ivec2 p;
+
+    uint hash(uint x) {
+        x ^= x >> 16;
+        x *= 0x7feb352dU;
+        x ^= x >> 15;
+        x *= 0x846ca68bU;
+        x ^= x >> 16;
+        return x;
+    }
+
+    uint fetch(int x, int y) {
+        return texelFetch(prev_frame, ivec2((x + size.x) % size.x, (y + size.y) % size.y), 0).r;
+    }
+
+    // A row's cells and, in the same bit positions, their west and east neighbours
+    void row(int y, out uint west, out uint center, out uint east) {
+        center = fetch(p.x, y);
+        west = (center << 1) | (fetch(p.x - 1, y) >> 31);
+        east = (center >> 1) | (fetch(p.x + 1, y) << 31);
+    }
+
+    void full_add(uint a, uint b, uint c, out uint sum, out uint carry) {
+        uint t = a ^ b;
+        sum = t ^ c;
+        carry = (a & b) | (t & c);
+    }
+
+    float sigmoid(float x) {
+        return 1.0 / (1.0 + exp(-x * 10.0));
+    }
+
+    void main() {
+        size = textureSize(prev_frame, 0);
+        p = ivec2(gl_FragCoord.xy);
+        uint seed = uint(p.y * size.x + p.x);
+        if (frame == 0) {
+            // About a quarter of the cells start alive
+            f_state = hash(seed * 2u) & hash(seed * 2u + 1u);
+            return;
+        }
+
+        uint aw, ac, ae, mw, mc, me, bw, bc, be;
+        row(p.y + 1, aw, ac, ae);
+        row(p.y, mw, mc, me);
+        row(p.y - 1, bw, bc, be);
+
+        // Sum the 8 neighbour bits into ones, twos, fours and eights planes
+        uint sa, ca, sb, cb, ones, k1, t, k2;
+        full_add(aw, ac, ae, sa, ca);
+        full_add(bw, bc, be, sb, cb);
+        full_add(sa, sb, mw ^ me, ones, k1);
+        full_add(ca, cb, mw & me, t, k2);
+        uint twos = t ^ k1;
+        uint fours = k2 ^ (t & k1);
+        uint eights = k2 & (t & k1);
+
+    #ifdef SMOOTH_RULE
+        uint base = hash(seed + uint(frame) * 0x9e3779b9U);
+        uint next = 0u;
+        for (int b = 0; b < 32; b++) {
+            float n = float(((ones >> b) & 1u) + 2u * ((twos >> b) & 1u) + 4u * ((fours >> b) & 1u) + 8u * ((eights >> b) & 1u));
+            float current = float((mc >> b) & 1u);
+            float survival = sigmoid(n - 1.5) * (1.0 - sigmoid(n - 3.5));
+            float birth = sigmoid(n - 2.5) * (1.0 - sigmoid(n - 3.5));
+            float alive = mix(current, mix(birth, survival, current), 0.2);
+            if (float(hash(base + uint(b))) < alive * 4294967295.0) {
+                next |= 1u << b;
+            }
+        }
+        f_state = next;
+    #else
+        // B3/S23: born with exactly 3 neighbours, survives with 2 or 3
+        f_state = twos & ~fours & ~eights & (ones | mc);
+    #endif
+    }
+"""
+
+
+def bit_life_shader(smooth=False):
+    return "#version 330\n" + ("#define SMOOTH_RULE\n" if smooth else "") + BIT_LIFE_SHADER
+
+
+SHADERS["Bit Life"] = bit_life_shader()
+SHADERS["Bit Life (Smooth)"] = bit_life_shader(smooth=True)
+
+# Internal programs used by render graph passes; they are not listed in the UI
+PASS_SHADERS = {
+    "Copy": """
+        #version 330
+        uniform sampler2D tex;
+        in vec2 v_texcoord;
+        out vec4 f_color;
+        void main() {
+            f_color = vec4(texture(tex, v_texcoord).rgb, 1.0);
+        }
+    """,
+    "Bit Life Colorize": """
+        #version 330
+        uniform usampler2D cells;
+        uniform vec2 resolution;
+        uniform float time;
+        uniform float zoom;
+        uniform vec2 offset;
+        in vec2 v_texcoord;
+        out vec4 f_color;
+
+        uint popcount(uint v) {
+            v = v - ((v >> 1) & 0x55555555U);
+            v = (v & 0x33333333U) + ((v >> 2) & 0x33333333U);
+            return (((v + (v >> 4)) & 0x0F0F0F0FU) * 0x01010101U) >> 24;
+        }
+
+        void main() {
+            ivec2 size = textureSize(cells, 0);
+            vec2 grid = vec2(size.x * 32, size.y);
+            // Zoom and pan across the wrapping grid
+            vec2 view = fract((v_texcoord - 0.5) * zoom + 0.5 + offset * 0.25);
+            ivec2 cell = ivec2(view * grid);
+            uint bits = texelFetch(cells, ivec2(cell.x >> 5, cell.y), 0).r >> (cell.x & 31);
+
+            // Average the cells of the word a pixel covers, so zoomed-out grids do not alias
+            int span = clamp(int(grid.x * zoom / resolution.x), 1, 32 - (cell.x & 31));
+            uint mask = span == 32 ? 0xFFFFFFFFU : (1u << span) - 1u;
+            float density = float(popcount(bits & mask)) / float(span);
+
+            vec3 col = 0.5 + 0.5 * cos(time * 0.3 + view.xyx * 6.0 + vec3(0, 2, 4));
+            f_color = vec4(col * density + vec3(0.01, 0.02, 0.03), 1.0);
+        }
+    """,
+}
+
+
+def feedback_graph(shader, size=(1024, 1024), components=4, dtype="f4", steps=1, tile=None, activity="rgba", refresh=0, reach=1):
+    # A simulation pass that ping-pongs a persistent state texture `steps` times per frame,
+    # then a copy to the screen. With a `tile` size the simulation only updates tiles whose
+    # `activity` channels are changing (see RenderPass).
+    simulate = {"name": "simulate", "shader": shader, "inputs": {"prev_frame": "state"}, "outputs": ["state"], "simulation": True}
+    if tile:
+        simulate.update(tile=tile, activity=activity, refresh=refresh, reach=reach)
+    return {
+        "steps": steps,
+        "resources": {
+            "state": {"size": size, "components": components, "dtype": dtype, "persistent": True},
+        },
+        "passes": [
+            simulate,
+            {"name": "present", "shader": "Copy", "inputs": {"tex": "state"}, "outputs": ["screen"]},
+        ],
+    }
+
+
+def bit_life_graph(shader, size=(16384, 16384)):
+    # Bit-packed cells (`size` in cells) stepped by `shader`, then colorized to the screen
+    return {
+        "resources": {
+            "cells": {"size": size, "components": 1, "dtype": "u4", "persistent": True, "pack": 32},
+        },
+        "passes": [
+            {"name": "simulate", "shader": shader, "inputs": {"prev_frame": "cells"}, "outputs": ["cells"], "simulation": True},
+            {"name": "colorize", "shader": "Bit Life Colorize", "inputs": {"cells": "cells"}, "outputs": ["screen"]},
+        ],
+    }
+
+
+def convolution_graph(shader, size=(1024, 1024), dtype="f2", channel=3, ri=3.0, ra=9.0):
+    # Like feedback_graph, but each step first averages one state channel over a disk of
+    # radius ri and the annulus out to ra by FFT; the simulation reads them from `disks`
+    return {
+        "resources": {
+            "state": {"size": size, "components": 4, "dtype": dtype, "persistent": True},
+            "disks": {"size": size, "components": 2, "dtype": "f4", "persistent": True},
+        },
+        "passes": [
+            {"name": "convolve", "convolution": {"channel": channel, "ri": ri, "ra": ra},
+             "inputs": {"state": "state"}, "outputs": ["disks"], "simulation": True},
+            {"name": "simulate", "shader": shader, "inputs": {"prev_frame": "state", "disks": "disks"},
+             "outputs": ["state"], "simulation": True},
+            {"name": "present", "shader": "Copy", "inputs": {"tex": "state"}, "outputs": ["screen"]},
+        ],
+    }
+
+
+# Render graph declarations: the passes of each shader, the named textures they read and
+# write, and each texture's size and format. Shaders not listed render in one pass.
+# State formats are the smallest that keep each simulation stable: 'f1' stores 8-bit
+# normalized channels, 'f2' half floats. Signed or slowly integrating state needs floats.
+# `steps` is the number of simulation steps per displayed frame. Sparse simulations track
+# activity on every channel they write, and those that reseed at random refresh every tile
+# now and then.
+# Each sparse pass declares its rule's reach in texels per step (see RenderPass).
+SHADER_GRAPHS = {
+    "Game of Life": feedback_graph("Game of Life", dtype="f1", tile=32, refresh=30),
+    "Smooth Life": convolution_graph("Smooth Life", dtype="f2"),
+    "Flame": feedback_graph("Flame", dtype="f2"),
+    "Reaction Diffusion": feedback_graph("Reaction Diffusion", dtype="f4", steps=10),
+    # Slime Mold agents sense 15 texels ahead (16 with filtering), so only one or two steps per frame stay sparse
+    "Slime Mold": feedback_graph("Slime Mold", dtype="f2", tile=32, activity="rgb", refresh=30, reach=16),
+    "Cellular Automata 3D": feedback_graph("Cellular Automata 3D", dtype="f1"),
+    "GPU Fire": feedback_graph("GPU Fire", dtype="f1"),
+    "Smoke / Ink": feedback_graph("Smoke / Ink", dtype="f2"),
+    "Droplet Ripples": feedback_graph("Droplet Ripples", dtype="f2"),
+    "Flow Field Simulation": feedback_graph("Flow Field Simulation", dtype="f2"),
+    "Bit Life": bit_life_graph("Bit Life"),
+    # The per-cell probabilistic rule costs far more than the bitwise one, so it runs a smaller grid
+    "Bit Life (Smooth)": bit_life_graph("Bit Life (Smooth)", size=(4096, 4096)),
+}
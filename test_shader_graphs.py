@@ -0,0 +1,109 @@
+import pytest
+
+pytest.importorskip("moderngl")
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+from render_cli import create_standalone_context
+from render_graph import RenderGraph, RenderPass, Resource
+from renderer import Renderer
+from shaders import SHADER_GRAPHS
+
+SIZE = (64, 64)
+
+
+@pytest.fixture(scope="module")
+def renderer():
+    try:
+        ctx = create_standalone_context()
+    except Exception as e:
+        pytest.skip(f"No OpenGL 3.3 context: {e}")
+    renderer = Renderer(ctx)
+    renderer.sim_size = SIZE
+    # One target for every case: releasing a bound framebuffer makes the next bind fail
+    renderer.target = ctx.framebuffer(color_attachments=[ctx.texture(SIZE, 4)])
+    yield renderer
+    ctx.release()
+
+
+@pytest.mark.parametrize("name", list(SHADER_GRAPHS))
+@pytest.mark.parametrize("sparse", [False, True])
+@pytest.mark.parametrize("steps", [None, 3])
+def test_graph_compiles_and_renders(renderer, name, sparse, steps):
+    # Every program of the graph, including the sparse tile and activity ones, must link
+    # and build its VAO, and a few frames must run without GL errors
+    # Reading the error flag clears it, so errors of earlier cases do not leak into this one
+    renderer.ctx.error
+    success, msg = renderer.load_shader(name)
+    assert success, msg
+    renderer.executor.sparse = sparse
+    renderer.sim_steps = steps
+    for frame in range(3):
+        renderer.render(frame / 60.0, SIZE, fbo=renderer.target)
+    assert renderer.ctx.error == "GL_NO_ERROR"
+
+
+# Plain B3/S23 Life in the alpha channel, seeded from a hash on the init step
+LIFE_SHADER = """
+    #version 330
+    uniform int frame;
+    uniform sampler2D prev_frame;
+    in vec2 v_texcoord;
+    out vec4 f_color;
+    void main() {
+        ivec2 size = textureSize(prev_frame, 0);
+        ivec2 p = ivec2(gl_FragCoord.xy);
+        if (frame == 0) {
+            f_color = vec4(fract(sin(dot(vec2(p), vec2(12.9898, 78.233))) * 43758.5453) > 0.7 ? 1.0 : 0.0);
+            return;
+        }
+        int n = 0;
+        for (int y = -1; y <= 1; y++) {
+            for (int x = -1; x <= 1; x++) {
+                if (x != 0 || y != 0) {
+                    n += int(texelFetch(prev_frame, (p + ivec2(x, y) + size) % size, 0).a > 0.5);
+                }
+            }
+        }
+        bool alive = texelFetch(prev_frame, p, 0).a > 0.5;
+        f_color = vec4(n == 3 || (alive && n == 2) ? 1.0 : 0.0);
+    }
+"""
+
+
+def life_cells(renderer, sparse, steps, frames=40):
+    # Live cells after `frames` frames of `steps` steps on a 256x256 grid of 16x16 tiles
+    graph = RenderGraph("life", [
+        RenderPass("simulate", LIFE_SHADER, {"prev_frame": "state"}, ["state"], simulation=True, tile=16),
+    ], [Resource("state", size=(256, 256), components=4, dtype="f1", persistent=True)])
+    success, msg = renderer.set_graph(graph)
+    assert success, msg
+    renderer.executor.sparse = sparse
+    renderer.sim_size = None
+    for frame in range(frames):
+        renderer.executor.execute(renderer.target, SIZE, {"time": 0.0}, steps=steps)
+    state = renderer.executor.history["state"][0]
+    return np.frombuffer(state.read(), dtype='u1').reshape(256, 256, 4)[..., 3] > 127
+
+
+# 20 steps per frame exceed what a 16-texel tile can absorb, so every tile is updated
+@pytest.mark.parametrize("steps", [1, 2, 3, 4, 20])
+def test_sparse_life_matches_dense(renderer, steps):
+    dense = life_cells(renderer, False, steps)
+    sparse = life_cells(renderer, True, steps)
+    renderer.sim_size = SIZE
+    assert dense.sum() > 0
+    assert (dense == sparse).all()
+
+
+def test_cache_eviction_keeps_current_graph(renderer):
+    # Warming other shaders through a tiny cache must not release the programs being drawn
+    small = Renderer(renderer.ctx, program_cache_size=2)
+    small.sim_size = SIZE
+    success, msg = small.load_shader("Game of Life")
+    assert success, msg
+    for name in SHADER_GRAPHS:
+        small.warm_shader(name)
+    renderer.ctx.error
+    small.render(0.0, SIZE, fbo=renderer.target)
+    assert renderer.ctx.error == "GL_NO_ERROR"
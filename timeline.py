@@ -0,0 +1,64 @@
+import bisect
+import json
+
+TIMELINE_VERSION = 1
+
+# Inputs that fully determine a rendered frame besides the shader clock
+INPUT_FIELDS = ("shader", "zoom", "offset_x", "offset_y", "auto_animate")
+
+
+class InputTimeline:
+    # Compact log of the inputs driving a live session. An event is only stored when an
+    # input changes or the shader clock jumps; in between, the clock advances with the
+    # session time, so frames can be re-rendered later at any resolution and frame rate.
+    def __init__(self, events=None):
+        self.events = events or []
+        self._times = []
+
+    @property
+    def duration(self):
+        return self.events[-1]["t"] if self.events else 0.0
+
+    def sample(self, t, clock, **inputs):
+        # `t` is the session time in seconds and `clock` the time the shader saw
+        if self.events:
+            last = self.events[-1]
+            expected_clock = last["clock"] + (t - last["t"])
+            unchanged = all(last[name] == inputs[name] for name in INPUT_FIELDS)
+            if unchanged and abs(clock - expected_clock) < 1e-3:
+                return False
+        event = {"t": round(t, 4), "clock": round(clock, 4)}
+        event.update((name, inputs[name]) for name in INPUT_FIELDS)
+        self.events.append(event)
+        return True
+
+    def finish(self, t):
+        # Close the timeline so its duration covers the time after the last change
+        if self.events and t > self.events[-1]["t"]:
+            last = dict(self.events[-1])
+            last["clock"] = round(last["clock"] + (t - last["t"]), 4)
+            last["t"] = round(t, 4)
+            self.events.append(last)
+
+    def state_at(self, t):
+        if not self.events:
+            raise ValueError("Timeline is empty")
+        if len(self._times) != len(self.events):
+            self._times = [event["t"] for event in self.events]
+        index = max(bisect.bisect_right(self._times, t) - 1, 0)
+        event = self.events[index]
+        state = {name: event[name] for name in INPUT_FIELDS}
+        state["clock"] = event["clock"] + (t - event["t"])
+        return state
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({"version": TIMELINE_VERSION, "events": self.events}, f, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("version") != TIMELINE_VERSION:
+            raise ValueError(f"Unsupported timeline version {data.get('version')}")
+        return cls(data["events"])
@@ -0,0 +1,89 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# Shared no-op scope handed out while tracing is off, so a disabled span costs one call
+_NULL_SPAN = nullcontext()
+_tracer = None
+
+
+class Tracer:
+    # Collects complete ("X") events in Chrome trace-event format, one track per thread.
+    # The file loads in Perfetto (ui.perfetto.dev) and chrome://tracing.
+    def __init__(self, path):
+        self.path = path
+        self.pid = os.getpid()
+        self.origin = time.perf_counter()
+        self.events = []
+        self.threads = {}
+        self.lock = threading.Lock()
+
+    def add(self, name, category, start, end, args=None):
+        # `start` and `end` are time.perf_counter() values
+        tid = threading.get_ident()
+        event = {
+            "name": name, "cat": category, "ph": "X", "pid": self.pid, "tid": tid,
+            "ts": (start - self.origin) * 1e6, "dur": (end - start) * 1e6,
+        }
+        if args:
+            event["args"] = args
+        with self.lock:
+            if tid not in self.threads:
+                self.threads[tid] = threading.current_thread().name
+            self.events.append(event)
+
+    @contextmanager
+    def span(self, name, category, args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, category, start, time.perf_counter(), args)
+
+    def save(self):
+        with self.lock:
+            events = list(self.events)
+            threads = dict(self.threads)
+        metadata = [{"name": "process_name", "ph": "M", "pid": self.pid, "tid": 0, "args": {"name": "GenerativeArtVideo"}}]
+        metadata += [
+            {"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}}
+            for tid, name in threads.items()
+        ]
+        with open(self.path, "w") as f:
+            json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, f)
+        return len(events)
+
+
+def start(path):
+    global _tracer
+    _tracer = Tracer(path)
+    print(f"Tracing to {path}")
+
+
+def stop():
+    # Write the trace file and turn tracing off; returns the path, or None if it was off
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is None:
+        return None
+    count = tracer.save()
+    print(f"Wrote {count} trace events to {tracer.path}")
+    return tracer.path
+
+
+def enabled():
+    return _tracer is not None
+
+
+def span(name, category="app", **args):
+    if _tracer is None:
+        return _NULL_SPAN
+    return _tracer.span(name, category, args)
+
+
+def complete(name, start, end=None, category="app", **args):
+    # Record a span measured by the caller, e.g. one that does not fit a with-block
+    if _tracer is not None:
+        _tracer.add(name, category, start, time.perf_counter() if end is None else end, args)
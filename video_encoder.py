@@ -0,0 +1,83 @@
+import queue
+import threading
+
+import tracing
+from encoders import PIXEL_FORMATS, create_encoder, frame_size
+
+_STOP = object()
+
+
+class VideoEncoder:
+    BACKPRESSURE_POLICIES = ("block", "drop")
+
+    def __init__(self, path, fps, queue_size=64, backpressure="block", pixel_format="bgr", backend="opencv", **options):
+        # `options` are passed to the encoder backend, e.g. fourcc for OpenCV or codec/crf for ffmpeg
+        if backpressure not in self.BACKPRESSURE_POLICIES:
+            raise ValueError(f"Unknown backpressure policy '{backpressure}'")
+        if pixel_format not in PIXEL_FORMATS:
+            raise ValueError(f"Unknown pixel format '{pixel_format}'")
+
+        self.path = path
+        self.fps = fps
+        self.pixel_format = pixel_format
+        self.backend = backend
+        self.options = options
+        self.backpressure = backpressure
+        self.queue = queue.Queue(maxsize=queue_size)
+
+        self.frames_submitted = 0
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.error = None
+
+        self.thread = threading.Thread(target=self._run, name="VideoEncoder", daemon=True)
+        self.thread.start()
+
+    def write(self, frame):
+        # The caller must not modify the frame after handing it over
+        self.frames_submitted += 1
+        with tracing.span("queue.put", "encode", pending=self.queue.qsize()):
+            if self.backpressure == "drop":
+                try:
+                    self.queue.put_nowait(frame)
+                except queue.Full:
+                    self.frames_dropped += 1
+                    return False
+            else:
+                self.queue.put(frame)
+        return True
+
+    def pending(self):
+        return self.queue.qsize()
+
+    def close(self):
+        self.queue.put(_STOP)
+        self.thread.join()
+        if self.error:
+            raise Exception(self.error)
+
+    def _run(self):
+        out = None
+        while True:
+            frame = self.queue.get()
+            if frame is _STOP:
+                break
+            if self.error:
+                # Keep draining so a blocked producer can make progress
+                continue
+            try:
+                if out is None:
+                    size = frame_size(frame, self.pixel_format)
+                    out = create_encoder(self.path, self.fps, size, self.pixel_format, self.backend, **self.options)
+                with tracing.span("encoder.write", "encode", backend=self.backend):
+                    out.write(frame)
+                self.frames_written += 1
+            except Exception as e:
+                self.error = str(e)
+                print(f"Encoder error: {e}")
+        if out is not None:
+            try:
+                out.close()
+            except Exception as e:
+                self.error = self.error or str(e)
+                print(f"Encoder error: {e}")